@@ -0,0 +1,93 @@
+from conftest import raw_db
+
+
+def first_entry(appmod, template_id):
+    with appmod.app.app_context():
+        return appmod.get_template_entries(template_id)[0]
+
+
+def forget_renders():
+    with raw_db() as db:
+        db.execute("DELETE FROM RenderedEntry")
+
+
+def bench_upload_entries_cold(appmod, bench, template_id):
+    bench(
+        "upload_entries (no stored renders)",
+        lambda: appmod.upload_entries(template_id=template_id),
+        rounds=2,
+        setup=forget_renders,
+    )
+
+
+def bench_upload_entries_unchanged(appmod, bench, template_id):
+    with appmod.app.app_context():
+        appmod.upload_entries(template_id=template_id)
+    bench(
+        "upload_entries (unchanged)",
+        lambda: appmod.upload_entries(template_id=template_id),
+    )
+
+
+def bench_upload_one_entry(appmod, bench, template_id):
+    entry = first_entry(appmod, template_id)
+    bench(
+        "upload_entries (one entry)",
+        lambda: appmod.upload_entries(
+            template_id=template_id, template_entry_ids=[entry["id"]]
+        ),
+    )
+
+
+def bench_regenerate_index(appmod, bench, template_id):
+    bench("regenerate_index", lambda: appmod.regenerate_index(template_id))
+
+
+def bench_entry_path_exists(appmod, bench, template_id):
+    entry = first_entry(appmod, template_id)
+
+    def lookups():
+        for _ in range(1000):
+            appmod.entry_path_exists(
+                db=appmod.get_db(),
+                template_id=template_id,
+                entry_path=entry["entry_path"],
+            )
+
+    queries = bench("entry_path_exists (x1000)", lookups)
+    assert len(queries) == 1000
+
+
+def bench_template_view(appmod, bench, client, template_id):
+    def view():
+        assert client.get(f"/templates/{template_id}").status_code == 200
+
+    queries = bench("GET /templates/<id>", view)
+    # one query for the entries however many there are
+    assert len(queries) < 10, queries
+
+
+def bench_entry_search(appmod, bench, client, template_id):
+    def search():
+        response = client.get(f"/templates/{template_id}/entries/search?q=dragon")
+        assert response.status_code == 200
+
+    bench("GET /templates/<id>/entries/search", search)
+
+
+def bench_update_entry(appmod, bench, client, template_id):
+    entry = first_entry(appmod, template_id)
+    form = {
+        field_name: "" if value is None else str(value)
+        for field_name, value in entry["template_variables"].items()
+        if field_name != "neocities_path"
+    }
+
+    def update():
+        response = client.post(
+            f"/templates/{template_id}/entry/{entry['id']}", data=form
+        )
+        assert response.status_code == 302
+        appmod.run_queued_publish_jobs()
+
+    bench("POST entry update and publish", update)
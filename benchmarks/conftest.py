@@ -0,0 +1,155 @@
+"""
+Benchmarks of the publish hot paths, run against FileClient on a generated
+database:
+
+    pytest benchmarks
+
+MOUSEADMIN_BENCH_ENTRIES (default 1000), MOUSEADMIN_BENCH_FIELDS (6) and
+MOUSEADMIN_BENCH_REVIEW_WORDS (300) size the data. Timings and query
+counts are printed at the end and, when MOUSEADMIN_BENCH_JSON is set,
+written there as JSON to compare runs.
+"""
+
+import contextlib
+import functools
+import http.server
+import importlib
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+import pytest
+
+import generate_data
+
+RESULTS = []
+
+
+@pytest.fixture(scope="session")
+def bench_dir():
+    directory = tempfile.mkdtemp(prefix="mouseadmin-bench-")
+    cwd = os.getcwd()
+    os.chdir(directory)
+    yield directory
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def image_base_url(bench_dir):
+    # images live under /img/ like the site's, which thumbnail() expects
+    handler = functools.partial(QuietHandler, directory=bench_dir)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/img"
+    server.shutdown()
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def template_id(bench_dir, image_base_url):
+    db_path = os.path.join(bench_dir, "bench.db")
+    start = time.monotonic()
+    [template_id] = generate_data.generate(
+        db_path,
+        entries=int(os.getenv("MOUSEADMIN_BENCH_ENTRIES", "1000")),
+        fields=int(os.getenv("MOUSEADMIN_BENCH_FIELDS", "6")),
+        review_words=int(os.getenv("MOUSEADMIN_BENCH_REVIEW_WORDS", "300")),
+        image_dir=os.path.join(bench_dir, "img"),
+        image_base_url=image_base_url,
+    )
+    RESULTS.append(
+        dict(name="generate_data", seconds=[time.monotonic() - start], queries=[])
+    )
+    os.environ.update(
+        MOUSEADMIN_DB=db_path,
+        NEOCITIES_CLIENT="file",
+        MOUSEADMIN_PUBLISH_WORKER="off",
+        MOUSEADMIN_UPLOAD_RATE="1000",
+        MOUSEADMIN_PUBLISH_DEBOUNCE_SECONDS="0",
+    )
+    return template_id
+
+
+@pytest.fixture(scope="session")
+def appmod(template_id):
+    return importlib.import_module("mouseadmin.app")
+
+
+@pytest.fixture
+def client(appmod):
+    return appmod.app.test_client()
+
+
+@pytest.fixture
+def bench(appmod):
+    """
+    bench(name, fn, rounds=3, setup=None) runs fn rounds times, each in a
+    fresh app context after calling setup, and records its wall time and
+    the number of SQL statements it ran (not counting statements SQLite
+    runs itself, for triggers and full-text indexes).
+
+    Returns the queries run in the last round.
+    """
+
+    def run(name, fn, rounds=3, setup=None):
+        result = dict(name=name, seconds=[], queries=[])
+        for _ in range(rounds):
+            with appmod.app.app_context():
+                if setup is not None:
+                    setup()
+                queries = []
+                appmod.get_db().set_trace_callback(
+                    lambda sql: sql.startswith("--") or queries.append(sql)
+                )
+                start = time.monotonic()
+                fn()
+                result["seconds"].append(time.monotonic() - start)
+                appmod.get_db().set_trace_callback(None)
+            result["queries"].append(len(queries))
+        RESULTS.append(result)
+        return queries
+
+    return run
+
+
+@contextlib.contextmanager
+def raw_db():
+    db = sqlite3.connect(os.environ["MOUSEADMIN_DB"])
+    try:
+        yield db
+        db.commit()
+    finally:
+        db.close()
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+    terminalreporter.section("benchmarks")
+    terminalreporter.write_line(
+        f"{'name':40} {'min s':>9} {'median s':>9} {'queries':>8}"
+    )
+    for result in RESULTS:
+        terminalreporter.write_line(
+            f"{result['name']:40} {min(result['seconds']):9.3f} "
+            f"{statistics.median(result['seconds']):9.3f} "
+            f"{max(result['queries'], default=0):8}"
+        )
+    if os.getenv("MOUSEADMIN_BENCH_JSON"):
+        with open(os.getenv("MOUSEADMIN_BENCH_JSON"), "w") as f:
+            json.dump(
+                dict(
+                    entries=int(os.getenv("MOUSEADMIN_BENCH_ENTRIES", "1000")),
+                    results=RESULTS,
+                ),
+                f,
+                indent=2,
+            )
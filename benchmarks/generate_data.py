@@ -0,0 +1,250 @@
+"""
+Fill a database with synthetic templates and entries for benchmarking.
+
+    python benchmarks/generate_data.py bench.db --templates 2 --entries 10000
+
+image_url fields point at PNGs written to --image-dir and served from
+--image-base-url, so thumbnails can be made without the network; serve the
+directory with e.g. `python -m http.server -d <image dir> 8765`.
+"""
+
+import argparse
+from datetime import date, timedelta
+import json
+import os
+import pathlib
+import random
+import sqlite3
+import sys
+
+from slugify import slugify
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from mouseadmin import migrations, search  # noqa: E402
+
+WORDS = (
+    "mouse cheese castle forest dungeon sword pixel quest dragon rhythm puzzle "
+    "racing ghost robot garden ocean star moon tower island jump combo boss "
+    "level secret music story hero village train kart shadow crystal"
+).split()
+
+FIELD_TYPES = ("html", "date", "select", "checkbox", "text", "image_url")
+
+RATINGS = ["1", "2", "3", "4", "5"]
+
+ENTRY_TEMPLATE = """<html><body>
+<h1>{{ title }}</h1>
+%s
+</body></html>"""
+
+INDEX_TEMPLATE = """<html><body><ul>
+{% for entry in entries %}<li><a href="{{ entry.neocities_path }}">{{ entry.title }}</a></li>{% endfor %}
+</ul></body></html>"""
+
+
+def words(rng, count):
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+def write_images(image_dir, count, seed=0):
+    """
+    Write count PNGs of random colours to image_dir.
+
+    Returns
+    -------
+    filenames : list of str
+    """
+    from PIL import Image
+
+    rng = random.Random(seed)
+    os.makedirs(image_dir, exist_ok=True)
+    filenames = []
+    for n in range(count):
+        filename = f"{n}.png"
+        path = os.path.join(image_dir, filename)
+        if not os.path.exists(path):
+            colour = tuple(rng.randrange(256) for _ in range(3))
+            Image.new("RGB", (800, 600), colour).save(path)
+        filenames.append(filename)
+    return filenames
+
+
+def field_value(rng, field_type, n, image_urls, review_words):
+    if field_type == "html":
+        paragraphs = max(review_words // 60, 1)
+        return "".join(f"<p>{words(rng, 60)}</p>" for _ in range(paragraphs))
+    if field_type == "date":
+        return str(date(2015, 1, 1) + timedelta(days=rng.randrange(3650)))
+    if field_type == "select":
+        return rng.choice(RATINGS)
+    if field_type == "checkbox":
+        return rng.random() < 0.5
+    if field_type == "image_url":
+        return image_urls[n % len(image_urls)] if image_urls else ""
+    return words(rng, 3)
+
+
+def generate(
+    db_path,
+    templates=1,
+    entries=1000,
+    fields=6,
+    review_words=300,
+    image_dir=None,
+    image_base_url=None,
+    images=20,
+    seed=0,
+):
+    """
+    Create (or extend) the database at db_path with synthetic data.
+
+    Parameters
+    ----------
+    templates : int
+        Templates to create, each published under its own /bench-<n>-... path.
+    entries : int
+        Entries per template.
+    fields : int
+        Fields per template besides ``title``, cycling through the input
+        types; image_url fields are left out without image_base_url.
+    review_words : int
+        Approximate words in each html field.
+    image_dir, image_base_url : str, optional
+        Where images are written and the URL they are served from.
+    images : int
+        Distinct images used by image_url fields.
+
+    Returns
+    -------
+    template_ids : list of int
+    """
+    rng = random.Random(seed)
+    db = sqlite3.connect(db_path)
+    migrations.migrate(db)
+
+    image_urls = []
+    if image_dir and image_base_url:
+        image_urls = [
+            f"{image_base_url.rstrip('/')}/{filename}"
+            for filename in write_images(image_dir, images, seed)
+        ]
+    field_types = [
+        field_type
+        for field_type in FIELD_TYPES
+        if field_type != "image_url" or image_urls
+    ]
+
+    template_ids = []
+    for t in range(templates):
+        name = f"bench-{t}-{rng.randrange(10**9)}"
+        template_fields = [("title", "text")] + [
+            (
+                f"{field_types[f % len(field_types)]}_{f}",
+                field_types[f % len(field_types)],
+            )
+            for f in range(fields)
+        ]
+        entry_template = ENTRY_TEMPLATE % "\n".join(
+            f"<p>{field_name}: {{{{ {field_name} }}}}</p>"
+            for field_name, _ in template_fields[1:]
+        )
+        template_id = db.execute(
+            """
+            insert into Template(name, neocities_path, entry_path_template, entry_template, index_template)
+            values (?, ?, ?, ?, ?)
+        """,
+            (
+                name,
+                f"/{name}",
+                "{{ slugify(title) }}.html",
+                entry_template,
+                INDEX_TEMPLATE,
+            ),
+        ).lastrowid
+        template_ids.append(template_id)
+
+        db.executemany(
+            """
+            insert into TemplateField(template_id, field_name, field_type, field_options)
+            values (?, ?, ?, ?)
+        """,
+            [
+                (
+                    template_id,
+                    field_name,
+                    field_type,
+                    json.dumps(RATINGS if field_type == "select" else [""]),
+                )
+                for field_name, field_type in template_fields
+            ],
+        )
+
+        for n in range(entries):
+            title = f"{words(rng, 2)} {n}"
+            template_entry_id = db.execute(
+                """
+                insert into TemplateEntry(timestamp, last_updated, template_id, entry_path)
+                values (?, ?, ?, ?)
+            """,
+                (
+                    f"2020-01-01 00:00:{n % 60:02}",
+                    f"2020-01-01 00:00:{n % 60:02}",
+                    template_id,
+                    f"{slugify(title)}.html",
+                ),
+            ).lastrowid
+            db.executemany(
+                """
+                insert into TemplateFieldValue(template_entry_id, template_field_name, value_json)
+                values (?, ?, ?)
+            """,
+                [
+                    (
+                        template_entry_id,
+                        field_name,
+                        json.dumps(
+                            title
+                            if field_name == "title"
+                            else field_value(
+                                rng, field_type, n, image_urls, review_words
+                            )
+                        ),
+                    )
+                    for field_name, field_type in template_fields
+                ],
+            )
+    db.commit()
+    search.rebuild_index(db)
+    db.close()
+    return template_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("db", help="sqlite database to create or extend")
+    parser.add_argument("--templates", type=int, default=1)
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--fields", type=int, default=6)
+    parser.add_argument("--review-words", type=int, default=300)
+    parser.add_argument("--image-dir")
+    parser.add_argument("--image-base-url")
+    parser.add_argument("--images", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    template_ids = generate(
+        args.db,
+        templates=args.templates,
+        entries=args.entries,
+        fields=args.fields,
+        review_words=args.review_words,
+        image_dir=args.image_dir,
+        image_base_url=args.image_base_url,
+        images=args.images,
+        seed=args.seed,
+    )
+    print(f"Created templates {template_ids} with {args.entries} entries each")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+alter table TemplateEntry add column entry_path text;
+
+create unique index template_entry_path on TemplateEntry (template_id, entry_path);
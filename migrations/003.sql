@@ -0,0 +1,13 @@
+create table PublishJob (
+  id integer primary key,
+  template_id integer not null,
+  kind text not null, -- 'entries' or 'index'
+  template_entry_ids text, -- json array, null for every entry
+  status text not null default 'queued', -- queued, running, failed or finished
+  queued_at datetime,
+  started_at datetime,
+  finished_at datetime,
+  summary text, -- json
+  error text,
+  foreign key (template_id) references Template(id)
+);
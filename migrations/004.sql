@@ -0,0 +1 @@
+alter table Template add column index_page_size integer; -- null for a single index page
@@ -0,0 +1,9 @@
+-- entry field values, looked up by entry and by field
+create index template_field_value_entry on TemplateFieldValue (template_entry_id, template_field_name);
+create index template_field_value_field on TemplateFieldValue (template_field_name);
+
+-- a template's entries newest first, and its fields
+create index template_entry_template on TemplateEntry (template_id, timestamp desc, id);
+create index template_field_template on TemplateField (template_id, field_name, field_type);
+
+create index publish_job_status on PublishJob (status, id);
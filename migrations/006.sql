@@ -0,0 +1,7 @@
+create table RenderedEntry (
+  template_entry_id integer primary key,
+  fingerprint text not null, -- hash of everything the render depends on
+  html text not null,
+  sha1_hash text not null,
+  foreign key (template_entry_id) references TemplateEntry(id)
+);
@@ -0,0 +1,44 @@
+-- full-text index of field values, kept in sync by the triggers below.
+-- rowid is TemplateFieldValue.id; JSON strings are indexed unquoted.
+create virtual table TemplateFieldValueSearch using fts5(
+  value,
+  template_field_name unindexed,
+  template_entry_id unindexed,
+  tokenize = 'unicode61 remove_diacritics 2'
+);
+
+create trigger template_field_value_search_insert after insert on TemplateFieldValue begin
+  insert into TemplateFieldValueSearch(rowid, value, template_field_name, template_entry_id)
+  values (
+    new.id,
+    case when json_valid(new.value_json) and json_type(new.value_json) = 'text'
+      then json_extract(new.value_json, '$') else new.value_json end,
+    new.template_field_name,
+    new.template_entry_id
+  );
+end;
+
+create trigger template_field_value_search_delete after delete on TemplateFieldValue begin
+  delete from TemplateFieldValueSearch where rowid = old.id;
+end;
+
+create trigger template_field_value_search_update after update on TemplateFieldValue begin
+  delete from TemplateFieldValueSearch where rowid = old.id;
+  insert into TemplateFieldValueSearch(rowid, value, template_field_name, template_entry_id)
+  values (
+    new.id,
+    case when json_valid(new.value_json) and json_type(new.value_json) = 'text'
+      then json_extract(new.value_json, '$') else new.value_json end,
+    new.template_field_name,
+    new.template_entry_id
+  );
+end;
+
+insert into TemplateFieldValueSearch(rowid, value, template_field_name, template_entry_id)
+select
+  id,
+  case when json_valid(value_json) and json_type(value_json) = 'text'
+    then json_extract(value_json, '$') else value_json end,
+  template_field_name,
+  template_entry_id
+from TemplateFieldValue;
@@ -0,0 +1,9 @@
+-- json {field name: weight} of the fields in the published search index
+alter table Template add column search_fields text;
+
+create table EntrySearchTokens (
+  template_entry_id integer primary key,
+  fingerprint text not null, -- hash of the values and weights scored
+  scores_json text not null,
+  foreign key (template_entry_id) references TemplateEntry(id)
+);
@@ -0,0 +1,14 @@
+-- the files on the site, as last listed or uploaded
+create table RemoteFile (
+  path text primary key, -- without a leading slash, as NeoCities lists it
+  is_directory boolean not null default 0,
+  size integer,
+  sha1_hash text,
+  updated_at text,
+  created_at text
+) without rowid;
+
+create table RemoteFileSync (
+  id integer primary key check (id = 1),
+  synced_at real not null -- unix time of the last full listing, 0 if stale
+);
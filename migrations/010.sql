@@ -0,0 +1,6 @@
+-- queued publishes of a template are merged into one job, run once no
+-- change has come in for a while
+alter table PublishJob add column run_after datetime; -- null to run when claimed
+alter table PublishJob add column coalesced integer not null default 0; -- publishes merged in
+
+create index publish_job_template on PublishJob (template_id, status);
@@ -0,0 +1,54 @@
+-- index field values as plain text, without their HTML tags, and entry
+-- paths as rows of their own: rowid is TemplateFieldValue.id for values
+-- and -TemplateEntry.id for paths, which have no template_field_name.
+-- search_text() is registered by migrations.migrate; 013 replaces the
+-- triggers using it.
+drop trigger template_field_value_search_insert;
+drop trigger template_field_value_search_delete;
+drop trigger template_field_value_search_update;
+drop table TemplateFieldValueSearch;
+
+create virtual table TemplateFieldValueSearch using fts5(
+  value,
+  template_field_name unindexed,
+  template_entry_id unindexed,
+  tokenize = 'unicode61 remove_diacritics 2'
+);
+
+create trigger template_field_value_search_insert after insert on TemplateFieldValue begin
+  insert into TemplateFieldValueSearch(rowid, value, template_field_name, template_entry_id)
+  values (new.id, search_text(new.value_json), new.template_field_name, new.template_entry_id);
+end;
+
+create trigger template_field_value_search_delete after delete on TemplateFieldValue begin
+  delete from TemplateFieldValueSearch where rowid = old.id;
+end;
+
+create trigger template_field_value_search_update after update on TemplateFieldValue begin
+  delete from TemplateFieldValueSearch where rowid = old.id;
+  insert into TemplateFieldValueSearch(rowid, value, template_field_name, template_entry_id)
+  values (new.id, search_text(new.value_json), new.template_field_name, new.template_entry_id);
+end;
+
+create trigger template_entry_search_insert after insert on TemplateEntry
+when new.entry_path is not null begin
+  insert into TemplateFieldValueSearch(rowid, value, template_entry_id)
+  values (-new.id, new.entry_path, new.id);
+end;
+
+create trigger template_entry_search_delete after delete on TemplateEntry begin
+  delete from TemplateFieldValueSearch where rowid = -old.id;
+end;
+
+create trigger template_entry_search_update after update of entry_path on TemplateEntry begin
+  delete from TemplateFieldValueSearch where rowid = -old.id;
+  insert into TemplateFieldValueSearch(rowid, value, template_entry_id)
+  select -new.id, new.entry_path, new.id where new.entry_path is not null;
+end;
+
+insert into TemplateFieldValueSearch(rowid, value, template_field_name, template_entry_id)
+select id, search_text(value_json), template_field_name, template_entry_id
+from TemplateFieldValue;
+
+insert into TemplateFieldValueSearch(rowid, value, template_entry_id)
+select -id, entry_path, id from TemplateEntry where entry_path is not null;
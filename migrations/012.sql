@@ -0,0 +1,4 @@
+-- the worker running a job, which updates heartbeat_at while it does, so
+-- jobs of workers that stopped can be told from ones still running
+alter table PublishJob add column worker text;
+alter table PublishJob add column heartbeat_at datetime;
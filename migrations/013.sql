@@ -0,0 +1,29 @@
+-- index field values with built-in SQL only, as 007 did, so connections
+-- without the app's search_text() function (the sqlite3 shell, scripts/)
+-- can still write TemplateFieldValue. The app replaces what these index
+-- with plain text after saving, see search.index_entries.
+drop trigger template_field_value_search_insert;
+drop trigger template_field_value_search_update;
+
+create trigger template_field_value_search_insert after insert on TemplateFieldValue begin
+  insert into TemplateFieldValueSearch(rowid, value, template_field_name, template_entry_id)
+  values (
+    new.id,
+    case when json_valid(new.value_json) and json_type(new.value_json) = 'text'
+      then json_extract(new.value_json, '$') else new.value_json end,
+    new.template_field_name,
+    new.template_entry_id
+  );
+end;
+
+create trigger template_field_value_search_update after update on TemplateFieldValue begin
+  delete from TemplateFieldValueSearch where rowid = old.id;
+  insert into TemplateFieldValueSearch(rowid, value, template_field_name, template_entry_id)
+  values (
+    new.id,
+    case when json_valid(new.value_json) and json_type(new.value_json) = 'text'
+      then json_extract(new.value_json, '$') else new.value_json end,
+    new.template_field_name,
+    new.template_entry_id
+  );
+end;
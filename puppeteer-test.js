@@ -16,6 +16,18 @@ async function validateFile(dir, filename, expectedContent) {
     }
 }
 
+// entries are published in the background, so wait for their files
+async function waitForFile(dir, filename, timeout = 10 * 1000) {
+    const filePath = path.join(dir, filename);
+    const start = Date.now();
+    while (!fs.existsSync(filePath)) {
+        if (Date.now() - start > timeout) {
+            throw new Error(`${filePath} was not published`);
+        }
+        await new Promise((resolve) => setTimeout(resolve, 100));
+    }
+}
+
 function startShellCommand(command, args = [], envVars = {}) {
     const env = { ...process.env, ...envVars };
 
@@ -61,7 +73,8 @@ const server = startShellCommand(
     {
         MOUSEADMIN_DB: 'testdb.db',
         FLASK_APP: 'src/mouseadmin/app.py',
-        WERKZEUG_DEBUG_PIN: 'off'
+        WERKZEUG_DEBUG_PIN: 'off',
+        MOUSEADMIN_PUBLISH_DEBOUNCE_SECONDS: '0'
     }
 );
 new Promise((resolve) => setTimeout(resolve, 1000));
@@ -211,6 +224,7 @@ const test = async () => {
         throw new Error('Page does not include newly created entry');
     }
 
+    await waitForFile('mock_data', '/example/path/test');
     await validateFile('mock_data', '/example/path/test', '');
 
     /*************************
@@ -229,6 +243,9 @@ const test = async () => {
         throw new Error('Page does not include newly updated entry');
     }
 
+    await waitForFile('mock_data', '/example/path/newvalue');
+    await validateFile('mock_data', '/example/path/newvalue', '');
+
     console.log('done! :-)');
     server.kill();
     await browser.close();
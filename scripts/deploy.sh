@@ -1,4 +1,4 @@
 #!/usr/bin/bash
-mkdir -p cache/reviews
+mkdir -p cache/site
 sudo systemctl restart mouseadmin
 echo deployed!
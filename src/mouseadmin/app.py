@@ -1,31 +1,31 @@
 from urllib.parse import unquote
 import hashlib
 import math
-from PIL import Image
-import io
 from itertools import groupby
 import sqlite3
-from functools import cached_property
+from functools import cached_property, lru_cache
 import time
 from dateutil import parser
 import requests
-import tempfile
 from slugify import slugify
 from decimal import Decimal
 import re
 from dataclasses import dataclass
 from datetime import datetime, date, timezone, timedelta
 import os
-from flask import Flask, render_template, request, redirect, g, render_template_string
+from flask import Flask, Response, render_template, request, redirect, g
 from bs4 import BeautifulSoup
 from typing import Optional
 import pathlib
 import json
 from slugify import slugify
 from abc import ABC, abstractmethod
-from time import sleep
 import logging
-from flask_caching import Cache
+import click
+import threading
+import traceback
+import socket
+from contextlib import contextmanager
 
 
 logging.basicConfig(
@@ -35,14 +35,21 @@ logging.basicConfig(
 )
 
 
-from mouseadmin import neocities, file_client
+from mouseadmin import (
+    neocities,
+    file_cache,
+    file_client,
+    manifest,
+    metrics,
+    migrations,
+    search,
+    thumbnails,
+    upload_scheduler,
+)
 
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = "jsdfao987jwer8xo3ru1m3rum89yem89f"
-app.config["CACHE_TYPE"] = "SimpleCache"
-app.config["CACHE_DEFAULT_TIMEOUT"] = 15  # timeout in seconds
-cache = Cache(app)
 
 NEOCITIES_DOMAIN = os.getenv("NEOCITIES_DOMAIN", "https://fern.neocities.org")
 
@@ -50,6 +57,23 @@ API_KEY = os.getenv("NEOCITIES_API_KEY")
 
 DATABASE = os.getenv("MOUSEADMIN_DB")
 
+thumbnail_cache = thumbnails.ThumbnailCache()
+
+site_file_cache = file_cache.HashedFileCache()
+
+THUMBNAIL_WORKERS = int(os.getenv("MOUSEADMIN_THUMBNAIL_WORKERS", "4"))
+
+THUMBNAIL_FETCHES_PER_HOST = int(
+    os.getenv("MOUSEADMIN_THUMBNAIL_FETCHES_PER_HOST", "4")
+)
+
+# seconds before the manifest of the site's files is replaced by a full
+# listing, and the shorter time after which a lookup of a missing file
+# lists the site again in case it was uploaded some other way
+MANIFEST_RESYNC_SECONDS = float(os.getenv("MOUSEADMIN_MANIFEST_RESYNC_SECONDS", "600"))
+
+MANIFEST_MISS_RESYNC_SECONDS = 15
+
 
 month_list = [
     "jan",
@@ -67,10 +91,23 @@ month_list = [
 ]
 
 
-@cache.cached(timeout=15)
-def listitems():
-    client = get_client()
-    return client.listitems()
+def neocities_path_of(remote_filename):
+    return unquote(remote_filename.split(NEOCITIES_DOMAIN)[1])
+
+
+def neocities_file_data(remote_filename):
+    """
+    Get the site listing's entry for a file, or None if it is not on the site.
+    """
+    pathname = neocities_path_of(remote_filename)
+    db = get_db()
+    manifest.refresh(db, get_client(), MANIFEST_RESYNC_SECONDS)
+    file_data = manifest.get_file(db, pathname)
+    if file_data is None and manifest.refresh(
+        db, get_client(), MANIFEST_MISS_RESYNC_SECONDS
+    ):
+        file_data = manifest.get_file(db, pathname)
+    return file_data
 
 
 def get_neocities_file(remote_filename):
@@ -81,42 +118,23 @@ def get_neocities_file(remote_filename):
     ----------
     remote_filename : str
         The name of the file on the server.
-    local_cache_path : str
-        The path to the locally cached file.
 
     Returns
     -------
     file_bytes : bytes
         The content of the file.
     """
-    client = get_client()
-    pathname = unquote(remote_filename.split(NEOCITIES_DOMAIN)[1])
-    local_cache_path = os.path.join("cache", pathname.strip("/"))
+    pathname = neocities_path_of(remote_filename)
     # Fetch file list and its SHA1 hash from server
-    files_info = listitems()
-    file_data = next(
-        (
-            file
-            for file in files_info.get("files", [])
-            if file["path"] == pathname.strip("/")
-        ),
-        None,
-    )
+    file_data = neocities_file_data(remote_filename)
 
     if not file_data:
         raise FileNotFoundError(f"File '{pathname}' not found on server.")
 
-    remote_hash = file_data["sha1_hash"]
-
     # Check local cache
-    if os.path.exists(local_cache_path):
-        with open(local_cache_path, "rb") as f:
-            local_bytes = f.read()
-            local_hash = hashlib.sha1(local_bytes).hexdigest()
-
-        # If hashes match, return cached version
-        if local_hash == remote_hash:
-            return local_bytes
+    local_bytes = site_file_cache.get(pathname, file_data["sha1_hash"])
+    if local_bytes is not None:
+        return local_bytes
 
     # If no match, download the file
     response = requests.get(remote_filename)
@@ -127,11 +145,8 @@ def get_neocities_file(remote_filename):
 
     file_bytes = response.content
 
-    os.makedirs(os.path.dirname(local_cache_path), exist_ok=True)
-
     # Update cache
-    with open(local_cache_path, "wb") as f:
-        f.write(file_bytes)
+    site_file_cache.put(pathname, file_bytes)
 
     return file_bytes
 
@@ -199,6 +214,10 @@ def thumbnail(image_url):
     return os.path.join("/img/THUMB", art_url)
 
 
+# bump when a change to the helpers below changes what templates render, so
+# stored entry renders are thrown away
+TEMPLATE_GLOBALS_VERSION = 1
+
 TEMPLATE_GLOBALS = {
     "slugify": slugify,
     "stars": stars,
@@ -217,50 +236,133 @@ TEMPLATE_GLOBALS = {
 
 
 def get_client():
-    return dict(
-        file=file_client.FileClient(), neocities=neocities.NeoCities(api_key=API_KEY)
-    )[os.getenv("NEOCITIES_CLIENT", "file")]
+    return make_client(os.getenv("NEOCITIES_CLIENT", "file"))
+
+
+@lru_cache(maxsize=None)
+def make_client(client_name):
+    # one long-lived client per process, so NeoCities connections are reused
+    if client_name == "neocities":
+        # NEOCITIES_TIMEOUT only changes the read timeout, connecting
+        # still gives up after 10 seconds
+        client = neocities.NeoCities(
+            api_key=API_KEY,
+            options=dict(timeout=(10, float(os.getenv("NEOCITIES_TIMEOUT", "120")))),
+        )
+    elif client_name == "file":
+        latency = [
+            float(seconds)
+            for seconds in os.getenv("MOUSEADMIN_FILE_CLIENT_LATENCY", "0").split(",")
+        ]
+        client = file_client.FileClient(
+            options=dict(
+                latency=latency if len(latency) > 1 else latency[0],
+                rate_limit=float(os.getenv("MOUSEADMIN_FILE_CLIENT_RATE_LIMIT", "0")),
+                failure_rate=float(
+                    os.getenv("MOUSEADMIN_FILE_CLIENT_FAILURE_RATE", "0")
+                ),
+            )
+        )
+    else:
+        raise ValueError("Unknown NEOCITIES_CLIENT", client_name)
+    return metrics.InstrumentedClient(client)
 
 
-def chunkify(files: list, chunk_size: int):
-    for chunk_i in range(math.ceil(len(files) / chunk_size)):
-        yield files[chunk_i * chunk_size : (chunk_i + 1) * chunk_size]
+@lru_cache(maxsize=None)
+def make_upload_scheduler(client_name):
+    # one per client, so the learned upload rate carries over between publishes
+    return upload_scheduler.UploadScheduler(
+        make_client(client_name),
+        max_batch_bytes=int(
+            os.getenv("MOUSEADMIN_UPLOAD_BATCH_BYTES", 8 * 1024 * 1024)
+        ),
+        max_batch_files=int(os.getenv("MOUSEADMIN_UPLOAD_BATCH_FILES", 25)),
+        rate=float(os.getenv("MOUSEADMIN_UPLOAD_RATE", 0.5)),
+        concurrency=int(os.getenv("MOUSEADMIN_UPLOAD_CONCURRENCY", 1)),
+    )
+
+
+def get_upload_scheduler():
+    return make_upload_scheduler(os.getenv("NEOCITIES_CLIENT", "file"))
+
+
+@metrics.timed("list_files")
+def remote_file_hashes(client):
+    """
+    Map each file path on the site (without a leading slash) to its SHA1 hash.
+    """
+    db = get_db()
+    manifest.refresh(db, client, MANIFEST_RESYNC_SECONDS)
+    return manifest.file_hashes(db)
 
 
-def upload_strings(files: dict[str, bytes | str]):
+@metrics.timed("upload")
+def upload_strings(files: dict[str, bytes | str], file_hashes=None):
     """
     files is a dict {filename: content}
+    file_hashes is an optional dict {filename: sha1 hash} of already known
+    hashes of files
+
+    Files whose SHA1 hash matches the one already on the site are skipped.
+    Returns a summary of what was uploaded and what was skipped.
     """
+    file_hashes = file_hashes or {}
 
-    CHUNK_SIZE = 25
+    client = get_client()
+    remote_hashes = remote_file_hashes(client)
 
-    def _temp_file_of(content: str | bytes):
+    changed_files = {}
+    changed_hashes = {}
+    skipped = 0
+    for neocities_path, content in files.items():
         if type(content) == str:
-            review_file = tempfile.NamedTemporaryFile(mode="w")
+            content = content.encode("utf-8")
+        content_hash = file_hashes.get(neocities_path)
+        if content_hash is None:
+            content_hash = hashlib.sha1(content).hexdigest()
+        if remote_hashes.get(neocities_path.strip("/")) == content_hash:
+            skipped += 1
         else:
-            review_file = tempfile.NamedTemporaryFile(mode="wb")
-
-        review_file.write(content)
-        review_file.seek(0)
-        return review_file
+            changed_files[neocities_path] = content
+            changed_hashes[neocities_path] = content_hash
 
-    file_objects = {
-        neocities_path: _temp_file_of(content)
-        for neocities_path, content in files.items()
-    }
     file_list = [
-        (file.name, neocities_path) for neocities_path, file in file_objects.items()
+        ((content, neocities_path), len(content))
+        for neocities_path, content in changed_files.items()
     ]
 
-    client = get_client()
-    looped = False
-    for index, chunk in enumerate(chunkify(list(file_list), CHUNK_SIZE)):
-        logging.info(f"Uploading chunk of size {len(chunk)}")
-        client.upload(*chunk)
-        if index != 0:
-            sleep(3)
+    try:
+        batch_stats = get_upload_scheduler().upload(file_list)
+    except Exception:
+        # some batches may have made it, so list the site again next time
+        manifest.mark_stale(get_db())
+        raise
+    manifest.record_uploads(
+        get_db(),
+        {
+            neocities_path: (len(content), changed_hashes[neocities_path])
+            for neocities_path, content in changed_files.items()
+        },
+    )
+
+    summary = dict(
+        uploaded=len(changed_files),
+        uploaded_bytes=sum(len(content) for content in changed_files.values()),
+        skipped=skipped,
+        **batch_stats,
+    )
+    metrics.uploaded_files.inc(summary["uploaded"])
+    metrics.uploaded_bytes.inc(summary["uploaded_bytes"])
+    metrics.skipped_files.inc(summary["skipped"])
+    metrics.rate_limit_wait_seconds.inc(summary["rate_limit_wait_seconds"])
+    logging.info(
+        f"Uploaded {summary['uploaded']} files ({summary['uploaded_bytes']} bytes), "
+        f"skipped {summary['skipped']} unchanged"
+    )
+    return summary
 
 
+@metrics.timed("load_entries")
 def get_template_variables(template_entry_id):
     db = get_db()
     field_values = db.execute(
@@ -279,19 +381,132 @@ def get_template_variables(template_entry_id):
         (str(template_entry_id),),
     ).fetchone()
 
-    parameters = {
-        field_value["field_name"]: json_loads(field_value["value_json"])
-        for field_value in field_values
-    }
-    parameters["neocities_path"] = os.path.join(
-        template["neocities_path"],
-        render_template_string(
-            template["entry_path_template"], **TEMPLATE_GLOBALS, **parameters
-        ),
+    _, parameters = entry_variables(
+        template,
+        [
+            (field_value["field_name"], field_value["value_json"])
+            for field_value in field_values
+        ],
     )
     return parameters
 
 
+compiled_templates = {}
+
+
+def compiled_template(template, column):
+    """
+    Get the compiled Jinja template for one of a Template row's source
+    columns, compiling it only the first time this source is seen.
+    """
+    source = template[column]
+    key = (
+        str(template["id"]),
+        column,
+        hashlib.sha1(source.encode("utf-8")).hexdigest(),
+    )
+    if key not in compiled_templates:
+        compiled_templates[key] = app.jinja_env.from_string(source)
+    return compiled_templates[key]
+
+
+def forget_compiled_templates(template_id):
+    for key in list(compiled_templates):
+        if key[0] == str(template_id):
+            compiled_templates.pop(key, None)
+
+
+def render_template_column(template, column, **context):
+    """
+    Like render_template_string, for the source stored in template[column].
+    """
+    with metrics.span(f"render_{column}"):
+        app.update_template_context(context)
+        return compiled_template(template, column).render(context)
+
+
+def render_entry_path_template(template, parameters):
+    return render_template_column(
+        template, "entry_path_template", **TEMPLATE_GLOBALS, **parameters
+    )
+
+
+def entry_variables(template, field_values, entry_path=None):
+    """
+    Build the variables an entry is rendered with from its
+    (field_name, value_json) pairs. The entry path is rendered unless the
+    stored one is passed in.
+
+    Returns the entry path and the variables.
+    """
+    parameters = {
+        field_name: json_loads(value_json) for field_name, value_json in field_values
+    }
+    if entry_path is None:
+        entry_path = render_entry_path_template(template, parameters)
+    parameters["neocities_path"] = os.path.join(template["neocities_path"], entry_path)
+    return entry_path, parameters
+
+
+@metrics.timed("load_entries")
+def get_template_entries(template_id, stored_paths=True):
+    """
+    Load every entry of a template, newest first, with one query for all
+    field values rather than one per entry. Entry paths come from
+    TemplateEntry.entry_path unless stored_paths is False or none is stored.
+
+    Returns
+    -------
+    entries : list of dict
+        The TemplateEntry columns plus ``entry_path`` and
+        ``template_variables`` (as returned by get_template_variables).
+    """
+    db = get_db()
+    template = db.execute(
+        "SELECT * from Template where id=?", (str(template_id),)
+    ).fetchone()
+    rows = db.execute(
+        """
+        SELECT
+            TemplateEntry.id,
+            TemplateEntry.timestamp,
+            TemplateEntry.last_updated,
+            TemplateEntry.template_id,
+            TemplateEntry.entry_path,
+            TemplateField.field_name,
+            TemplateFieldValue.value_json
+        FROM TemplateEntry
+        LEFT JOIN TemplateFieldValue ON TemplateFieldValue.template_entry_id=TemplateEntry.id
+        LEFT JOIN TemplateField ON TemplateField.field_name=TemplateFieldValue.template_field_name
+            AND TemplateField.template_id=TemplateEntry.template_id
+        WHERE TemplateEntry.template_id=?
+        ORDER BY TemplateEntry.timestamp DESC, TemplateEntry.id
+    """,
+        (str(template_id),),
+    ).fetchall()
+
+    entries = {}
+    field_values = {}
+    for row in rows:
+        if row["id"] not in entries:
+            entries[row["id"]] = dict(
+                id=row["id"],
+                timestamp=row["timestamp"],
+                last_updated=row["last_updated"],
+                template_id=row["template_id"],
+                entry_path=row["entry_path"] if stored_paths else None,
+            )
+            field_values[row["id"]] = []
+        if row["field_name"] is not None:
+            field_values[row["id"]].append((row["field_name"], row["value_json"]))
+
+    for entry_id, entry in entries.items():
+        entry["entry_path"], entry["template_variables"] = entry_variables(
+            template, field_values[entry_id], entry["entry_path"]
+        )
+    return list(entries.values())
+
+
 def regenerate_index(template_id):
     db = get_db()
 
@@ -299,28 +514,120 @@ def regenerate_index(template_id):
         "SELECT * from Template where id=?", (str(template_id),)
     ).fetchone()
 
-    template_entry_ids = [
-        row["id"]
-        for row in db.execute(
-            "SELECT id FROM TemplateEntry WHERE template_id=? ORDER BY timestamp DESC",
-            (str(template_id),),
-        ).fetchall()
-    ]
-    entries = [get_template_variables(entry_id) for entry_id in template_entry_ids]
-    index_path = os.path.join(
-        template["neocities_path"],
-        "index.html",
-    )
-    index_html = render_template_string(
-        template["index_template"], entries=entries, **TEMPLATE_GLOBALS
+    template_entries = get_template_entries(template_id)
+    entries = [entry["template_variables"] for entry in template_entries]
+    return upload_strings(
+        render_index(template, entries)
+        | render_search_index(template, template_entries)
     )
 
-    upload_strings({index_path: index_html})
+
+def index_page_path(template, page_number):
+    if page_number == 1:
+        return os.path.join(template["neocities_path"], "index.html")
+    return os.path.join(template["neocities_path"], "page", f"{page_number}.html")
+
+
+def index_pages(template, entry_count):
+    """
+    Returns
+    -------
+    page_size, page_count : int
+        Entries per index page, and the number of pages.
+    """
+    page_size = template["index_page_size"] or max(entry_count, 1)
+    return page_size, max(math.ceil(entry_count / page_size), 1)
+
+
+def stale_index_page_paths(template, page_count):
+    """
+    Paths on the site of numbered index pages past page_count, left from
+    when the template had more entries or smaller pages. Read from the
+    manifest.
+    """
+    page_directory = os.path.dirname(index_page_path(template, 2)).strip("/")
+    stale_paths = []
+    for path in manifest.file_paths(get_db(), page_directory):
+        match = re.fullmatch(re.escape(page_directory) + r"/(\d+)\.html", path)
+        if match and int(match[1]) > page_count:
+            stale_paths.append(path)
+    return stale_paths
+
+
+def render_index(template, entries, page_numbers=None):
+    """
+    Render a template's index.
+
+    When the template has an index_page_size the index is split into
+    numbered pages of that many entries, and only page_numbers (every page
+    when None) are rendered. Each page gets its entries as ``entries`` and
+    its position as ``page``, which also has the path of the search index
+    when the template publishes one.
+
+    Returns
+    -------
+    files : dict
+        {neocities path: html} for each rendered page.
+    """
+    page_size, page_count = index_pages(template, len(entries))
+    page_paths = [
+        index_page_path(template, page_number)
+        for page_number in range(1, page_count + 1)
+    ]
+
+    if page_numbers is None:
+        page_numbers = range(1, page_count + 1)
+
+    files = {}
+    for page_number in sorted(page_numbers):
+        if page_number > page_count:
+            continue
+        page = dict(
+            number=page_number,
+            count=page_count,
+            size=page_size,
+            total_entries=len(entries),
+            paths=page_paths,
+            path=page_paths[page_number - 1],
+            previous_path=page_paths[page_number - 2] if page_number > 1 else None,
+            next_path=page_paths[page_number] if page_number < page_count else None,
+            search_index_path=(
+                search_index_path(template) if search_field_weights(template) else None
+            ),
+        )
+        files[page["path"]] = render_template_column(
+            template,
+            "index_template",
+            entries=entries[(page_number - 1) * page_size : page_number * page_size],
+            page=page,
+            **TEMPLATE_GLOBALS,
+        )
+    return files
 
 
-def upload_entries(*, template_entry_id=None, template_id=None):
+def upload_entries(
+    *,
+    template_entry_id=None,
+    template_id=None,
+    template_entry_ids=None,
+    all_index_pages=False,
+    include_index=True,
+):
+    """
+    Render and upload entry pages and the index of a template.
+
+    Uploads a single entry's page when given template_entry_id, the pages
+    of template_entry_ids when given those along with template_id, and
+    every entry's page when given only template_id.
+
+    Only the index pages listing the uploaded entries are rendered, unless
+    all_index_pages is set because entries were added and the rest moved
+    down the index. No index pages are rendered without include_index.
+    """
     if template_entry_id is None and template_id is None:
         raise ValueError("Supply one of template_entry_id or template_id")
+    if template_entry_id is not None:
+        template_entry_ids = [template_entry_id]
 
     db = get_db()
 
@@ -332,14 +639,6 @@ def upload_entries(*, template_entry_id=None, template_id=None):
         ).fetchone()["template_id"]
     )
 
-    template_entry_ids = [
-        row["id"]
-        for row in db.execute(
-            "SELECT id FROM TemplateEntry WHERE template_id=? ORDER BY timestamp DESC",
-            (str(template_id),),
-        ).fetchall()
-    ]
-
     template_fields = db.execute(
         "SELECT * FROM TemplateField where template_id=?", (str(template_id),)
     )
@@ -347,47 +646,538 @@ def upload_entries(*, template_entry_id=None, template_id=None):
         template_field["field_name"]: InputType.from_field_type(
             template_field["field_type"]
         )
-        for template_field in template_fields
-    }
+        for template_field in template_fields
+    }
+
+    template = db.execute(
+        "SELECT * from Template where id=?", (str(template_id),)
+    ).fetchone()
+
+    template_entries = get_template_entries(template_id)
+    entries = [entry["template_variables"] for entry in template_entries]
+    if template_entry_ids is not None:
+        template_entry_ids = {str(entry_id) for entry_id in template_entry_ids}
+    published_entries = [
+        template_entry
+        for template_entry in template_entries
+        if template_entry_ids is None or str(template_entry["id"]) in template_entry_ids
+    ]
+
+    files = {}
+    file_hashes = {}
+    values_by_input_key = {}
+
+    # create entries, reusing their last render when nothing it used changed
+    rendered_entries = get_rendered_entries(
+        template_id,
+        None if template_entry_ids is None else list(template_entry_ids),
+    )
+    newly_rendered = []
+    for template_entry in published_entries:
+        entry = template_entry["template_variables"]
+        filepath = entry["neocities_path"]
+        fingerprint = render_fingerprint(template, entry)
+        rendered = rendered_entries.get(template_entry["id"])
+        if rendered is not None and rendered["fingerprint"] == fingerprint:
+            file_contents = rendered["html"]
+            file_hashes[filepath] = rendered["sha1_hash"]
+        else:
+            template_parameters = {**TEMPLATE_GLOBALS, **entry}
+            file_contents = render_template_column(
+                template, "entry_template", **template_parameters
+            )
+            file_hashes[filepath] = hashlib.sha1(
+                file_contents.encode("utf-8")
+            ).hexdigest()
+            newly_rendered.append(
+                (
+                    template_entry["id"],
+                    fingerprint,
+                    file_contents,
+                    file_hashes[filepath],
+                )
+            )
+
+        for field_name, field_value in entry.items():
+            if field_name in inputs_by_field_name:
+                input_type = inputs_by_field_name[field_name]
+                values_by_input_key.setdefault(input_type.KEY, []).append(field_value)
+
+        files[filepath] = file_contents
+
+    db.executemany(
+        """
+        INSERT OR REPLACE INTO RenderedEntry(template_entry_id, fingerprint, html, sha1_hash)
+        VALUES (?, ?, ?, ?)
+    """,
+        newly_rendered,
+    )
+    db.commit()
+    logging.info(
+        f"Rendered {len(newly_rendered)} entries, "
+        f"reused {len(published_entries) - len(newly_rendered)} unchanged"
+    )
+
+    # create extra files, all values of an input type at once
+    for input_key, values in values_by_input_key.items():
+        files |= InputType.from_field_type(input_key).extra_files_many(values)
+
+    if not include_index:
+        index_page_numbers = set()
+    elif template_entry_ids is None or all_index_pages:
+        index_page_numbers = None
+    else:
+        page_size, _ = index_pages(template, len(entries))
+        index_page_numbers = {
+            position // page_size + 1
+            for position, template_entry in enumerate(template_entries)
+            if str(template_entry["id"]) in template_entry_ids
+        }
+    files |= render_index(template, entries, index_page_numbers)
+    if include_index:
+        files |= render_search_index(template, template_entries)
+
+    summary = upload_strings(files, file_hashes)
+    if include_index:
+        # pages past the last one would keep listing old entries
+        _, page_count = index_pages(template, len(entries))
+        stale_paths = stale_index_page_paths(template, page_count)
+        if stale_paths:
+            get_client().delete(*stale_paths)
+            manifest.record_deletes(get_db(), stale_paths)
+            logging.info(f"Deleted {len(stale_paths)} index pages past the last")
+    return summary
+
+
+def search_field_weights(template):
+    return json_loads(template["search_fields"]) or {}
+
+
+def search_index_path(template):
+    return os.path.join(template["neocities_path"], "search.json")
+
+
+def render_search_index(template, template_entries):
+    """
+    Build the search index of a template's published entries (see
+    search.public_index), rescoring only entries whose searched values or
+    field weights changed since their scores were stored.
+
+    Returns
+    -------
+    files : dict
+        {neocities path: json}, empty when the template has no search
+        fields.
+    """
+    field_weights = search_field_weights(template)
+    if not field_weights:
+        return {}
+
+    db = get_db()
+    stored = {
+        row["template_entry_id"]: row
+        for row in db.execute(
+            """
+            SELECT EntrySearchTokens.*
+            FROM EntrySearchTokens
+            INNER JOIN TemplateEntry ON TemplateEntry.id=EntrySearchTokens.template_entry_id
+            WHERE TemplateEntry.template_id=?
+        """,
+            (str(template["id"]),),
+        ).fetchall()
+    }
+    index_entries = []
+    rescored = []
+    for template_entry in template_entries:
+        entry = template_entry["template_variables"]
+        values = {field_name: entry.get(field_name) for field_name in field_weights}
+        fingerprint = hashlib.sha1(
+            json_dumps([values, field_weights]).encode("utf-8")
+        ).hexdigest()
+        row = stored.get(template_entry["id"])
+        if row is not None and row["fingerprint"] == fingerprint:
+            scores = json_loads(row["scores_json"])
+        else:
+            scores = search.entry_token_scores(values, field_weights)
+            rescored.append((template_entry["id"], fingerprint, json_dumps(scores)))
+        title = search.plain_text(values[next(iter(field_weights))])
+        index_entries.append((entry["neocities_path"], title, scores))
+
+    db.executemany(
+        """
+        INSERT OR REPLACE INTO EntrySearchTokens(template_entry_id, fingerprint, scores_json)
+        VALUES (?, ?, ?)
+    """,
+        rescored,
+    )
+    db.commit()
+    return {
+        search_index_path(template): search.public_index(index_entries, field_weights)
+    }
+
+
+def render_fingerprint(template, entry):
+    """
+    Fingerprint of everything an entry's rendered page depends on: its
+    variables, the entry template's source and the template helpers.
+    """
+    return hashlib.sha1(
+        json_dumps(
+            [
+                entry,
+                hashlib.sha1(template["entry_template"].encode("utf-8")).hexdigest(),
+                TEMPLATE_GLOBALS_VERSION,
+            ]
+        ).encode("utf-8")
+    ).hexdigest()
+
+
+def get_rendered_entries(template_id, template_entry_ids=None):
+    """
+    Load the stored renders of a template's entries, or only of
+    template_entry_ids when given.
+
+    Returns
+    -------
+    rendered_entries : dict
+        {template_entry_id: RenderedEntry row}
+    """
+    db = get_db()
+    if template_entry_ids is None:
+        rows = db.execute(
+            """
+            SELECT RenderedEntry.*
+            FROM RenderedEntry
+            INNER JOIN TemplateEntry ON TemplateEntry.id=RenderedEntry.template_entry_id
+            WHERE TemplateEntry.template_id=?
+        """,
+            (str(template_id),),
+        ).fetchall()
+    else:
+        rows = db.execute(
+            f"""
+            SELECT * FROM RenderedEntry
+            WHERE template_entry_id IN ({", ".join("?" * len(template_entry_ids))})
+        """,
+            template_entry_ids,
+        ).fetchall()
+    return {row["template_entry_id"]: row for row in rows}
+
+
+PUBLISH_WORKER = os.getenv("MOUSEADMIN_PUBLISH_WORKER", "thread")
+
+PUBLISH_POLL_SECONDS = 5
+
+# a running job's worker updates its heartbeat this often, and the job is
+# queued again once its heartbeat is this old
+PUBLISH_HEARTBEAT_SECONDS = 10
+
+PUBLISH_STALE_SECONDS = 6 * PUBLISH_HEARTBEAT_SECONDS
+
+
+# a queued publish waits this long for more changes to the same template to
+# merge into it, each change pushing it back, up to the max after queueing
+PUBLISH_DEBOUNCE_SECONDS = float(os.getenv("MOUSEADMIN_PUBLISH_DEBOUNCE_SECONDS", "3"))
+
+PUBLISH_DEBOUNCE_MAX_SECONDS = 10 * PUBLISH_DEBOUNCE_SECONDS
+
+# which index pages each kind of publish job uploads
+PUBLISH_INDEX_PAGES = {"entry_pages": 0, "entries": 1, "new_entries": 2, "index": 2}
+
+PUBLISH_KIND_BY_INDEX_PAGES = ["entry_pages", "entries", "new_entries"]
+
+publish_jobs_available = threading.Event()
+publish_worker_started = False
+publish_worker_lock = threading.Lock()
+
+
+def enqueue_publish(*, template_id, kind="entries", template_entry_ids=None):
+    """
+    Record a publish job for the worker to pick up, or merge it into the
+    job already queued for the template.
+
+    kind is "entries" to upload the pages of template_entry_ids (every
+    entry when None) along with the index pages listing them,
+    "new_entries" to upload the pages of newly added template_entry_ids
+    along with every index page, "entry_pages" to upload entry pages
+    without the index, or "index" to upload only the index.
+    """
+    db = get_db()
+    now = datetime.now()
+    run_after = now + timedelta(seconds=PUBLISH_DEBOUNCE_SECONDS)
+    # hold the write lock from reading the queued job to merging into it, so
+    # neither another save nor the worker claiming it can come in between
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        queued = db.execute(
+            """
+            SELECT * FROM PublishJob WHERE template_id=? AND status='queued'
+            ORDER BY id DESC LIMIT 1
+        """,
+            (str(template_id),),
+        ).fetchone()
+        if queued is None:
+            db.execute(
+                """
+                insert into PublishJob(template_id, kind, template_entry_ids, queued_at, run_after)
+                values(?, ?, ?, ?, ?)
+            """,
+                (
+                    str(template_id),
+                    kind,
+                    (
+                        None
+                        if template_entry_ids is None
+                        else json_dumps(template_entry_ids)
+                    ),
+                    now,
+                    run_after,
+                ),
+            )
+        else:
+            merged_kind, merged_entry_ids = merge_publishes(
+                (queued["kind"], json_loads(queued["template_entry_ids"])),
+                (kind, template_entry_ids),
+            )
+            db.execute(
+                """
+                UPDATE PublishJob
+                SET kind=?, template_entry_ids=?, run_after=?, coalesced=coalesced + 1
+                WHERE id=?
+            """,
+                (
+                    merged_kind,
+                    None if merged_entry_ids is None else json_dumps(merged_entry_ids),
+                    min(
+                        run_after,
+                        datetime.fromisoformat(queued["queued_at"])
+                        + timedelta(seconds=PUBLISH_DEBOUNCE_MAX_SECONDS),
+                    ),
+                    queued["id"],
+                ),
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if queued is None:
+        publish_jobs_available.set()
+    else:
+        metrics.publish_coalesced.inc(kind=kind)
+
+
+def merge_publishes(*publishes):
+    """
+    Combine publish jobs of one template.
+
+    Parameters
+    ----------
+    publishes : tuple (str, list or None)
+        The kind and template_entry_ids of each job, as in enqueue_publish.
+
+    Returns
+    -------
+    publish : tuple (str, list or None)
+        The kind and template_entry_ids of a job uploading everything the
+        given jobs would.
+    """
+    entry_ids = set()
+    for kind, template_entry_ids in publishes:
+        if kind == "index":
+            continue
+        if template_entry_ids is None:
+            entry_ids = None
+            break
+        entry_ids |= set(template_entry_ids)
+    index_pages = max(PUBLISH_INDEX_PAGES[kind] for kind, _ in publishes)
+    if entry_ids == set() and index_pages == PUBLISH_INDEX_PAGES["index"]:
+        return "index", None
+    return (
+        PUBLISH_KIND_BY_INDEX_PAGES[index_pages],
+        None if entry_ids is None else sorted(entry_ids),
+    )
+
+
+def publish_worker_id():
+    # worked out on each call, as processes may fork after import
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_publish_job(db):
+    # the oldest job that is due, unless its template is already publishing
+    job = db.execute(
+        """
+        UPDATE PublishJob SET status='running', started_at=?, worker=?, heartbeat_at=?
+        WHERE id=(
+            SELECT id FROM PublishJob AS queued
+            WHERE status='queued'
+            AND (run_after IS NULL OR run_after <= ?)
+            AND NOT EXISTS (
+                SELECT 1 FROM PublishJob
+                WHERE template_id=queued.template_id AND status='running'
+            )
+            ORDER BY id LIMIT 1
+        )
+        RETURNING *
+    """,
+        (datetime.now(), publish_worker_id(), datetime.now(), datetime.now()),
+    ).fetchone()
+    db.commit()
+    return job
+
+
+def requeue_stale_publish_jobs(db):
+    """
+    Queue again the running jobs whose worker has stopped, noticed by its
+    heartbeat, as they would otherwise block their template for good.
+    """
+    requeued = db.execute(
+        """
+        UPDATE PublishJob SET status='queued', started_at=NULL, worker=NULL
+        WHERE status='running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)
+        RETURNING id
+    """,
+        (datetime.now() - timedelta(seconds=PUBLISH_STALE_SECONDS),),
+    ).fetchall()
+    db.commit()
+    for job in requeued:
+        logging.warning(f"Requeued publish job {job['id']}, its worker stopped")
+
+
+@contextmanager
+def publish_heartbeat(job_id):
+    """Update the heartbeat of a job, from another thread, while it runs."""
+    stopped = threading.Event()
+
+    def beat():
+        with app.app_context():
+            db = get_db()
+            while not stopped.wait(PUBLISH_HEARTBEAT_SECONDS):
+                db.execute(
+                    "UPDATE PublishJob SET heartbeat_at=? WHERE id=? AND worker=?",
+                    (datetime.now(), job_id, publish_worker_id()),
+                )
+                db.commit()
+
+    thread = threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run_publish_job(job):
+    db = get_db()
+    start = time.perf_counter()
+    summary = {}
+    with metrics.collect_spans() as spans, publish_heartbeat(job["id"]):
+        try:
+            if job["kind"] == "index":
+                summary = regenerate_index(job["template_id"])
+            else:
+                summary = upload_entries(
+                    template_id=job["template_id"],
+                    template_entry_ids=json_loads(job["template_entry_ids"]),
+                    all_index_pages=job["kind"] == "new_entries",
+                    include_index=job["kind"] != "entry_pages",
+                )
+            status = "finished"
+        except Exception:
+            logging.exception(f"Publish job {job['id']} failed")
+            status = "failed"
+            error = traceback.format_exc()
+    seconds = time.perf_counter() - start
+
+    metrics.publish_seconds.observe(seconds, kind=job["kind"])
+    metrics.publish_jobs.inc(kind=job["kind"], status=status)
+    logging.info(
+        f"Publish job {job['id']} ({job['kind']}, template {job['template_id']}) "
+        f"{status} in {seconds:.2f}s: "
+        + ", ".join(f"{name} {total:.2f}s" for name, total in spans.items())
+        + f"; uploaded {summary.get('uploaded', 0)} files, "
+        f"skipped {summary.get('skipped', 0)}, "
+        f"rate limited {summary.get('rate_limit_wait_seconds', 0)}s"
+    )
+
+    if status == "failed":
+        db.execute(
+            """
+            UPDATE PublishJob SET status='failed', finished_at=?, error=?
+            WHERE id=? AND worker=?
+        """,
+            (datetime.now(), error, job["id"], publish_worker_id()),
+        )
+    else:
+        db.execute(
+            """
+            UPDATE PublishJob SET status='finished', finished_at=?, summary=?
+            WHERE id=? AND worker=?
+        """,
+            (datetime.now(), json_dumps(summary), job["id"], publish_worker_id()),
+        )
+    db.commit()
 
-    template = db.execute(
-        "SELECT * from Template where id=?", (str(template_id),)
-    ).fetchone()
 
-    entries = [get_template_variables(entry_id) for entry_id in template_entry_ids]
+def run_queued_publish_jobs():
+    """
+    Run publish jobs that are due until there are none left.
 
-    files = {}
+    Returns
+    -------
+    wait_seconds : float or None
+        Seconds until the next queued job is due, or None when no jobs are
+        queued.
+    """
+    with app.app_context():
+        requeue_stale_publish_jobs(get_db())
+    while True:
+        with app.app_context():
+            db = get_db()
+            job = claim_publish_job(db)
+            if job is None:
+                next_run = db.execute(
+                    "SELECT min(coalesce(run_after, queued_at)) FROM PublishJob WHERE status='queued'"
+                ).fetchone()[0]
+                if next_run is None:
+                    return None
+                return max(
+                    (datetime.fromisoformat(next_run) - datetime.now()).total_seconds(),
+                    0,
+                )
+            run_publish_job(job)
 
-    # create entries
-    for _, entry in filter(
-        lambda entry: (
-            str(entry[0]) == str(template_entry_id) if template_entry_id else True
-        ),
-        zip(template_entry_ids, entries),
-    ):
-        template_parameters = {**TEMPLATE_GLOBALS, **entry}
-        filepath = entry["neocities_path"]
-        file_contents = render_template_string(
-            template["entry_template"], **template_parameters
-        )
 
-        # create extra files
-        for field_name, field_value in entry.items():
-            if field_name in inputs_by_field_name:
-                files |= inputs_by_field_name[field_name].extra_files(field_value)
+def publish_worker():
+    while True:
+        wait_seconds = None
+        try:
+            wait_seconds = run_queued_publish_jobs()
+        except Exception:
+            logging.exception("Publish worker error")
+        if wait_seconds is None:
+            wait_seconds = PUBLISH_POLL_SECONDS
+        # not too short, in case the job due waits on another process's job
+        publish_jobs_available.wait(min(max(wait_seconds, 0.1), PUBLISH_POLL_SECONDS))
+        publish_jobs_available.clear()
 
-        files[filepath] = file_contents
 
-    index_path = os.path.join(
-        template["neocities_path"],
-        "index.html",
-    )
-    index_html = render_template_string(
-        template["index_template"], entries=entries, **TEMPLATE_GLOBALS
-    )
-    files[index_path] = index_html
+@app.before_request
+def start_publish_worker():
+    global publish_worker_started
+    if PUBLISH_WORKER != "thread" or publish_worker_started:
+        return
+    with publish_worker_lock:
+        if not publish_worker_started:
+            threading.Thread(target=publish_worker, daemon=True).start()
+            publish_worker_started = True
+
 
-    upload_strings(files)
+@app.cli.command("publish-worker")
+def publish_worker_command():
+    """Run queued publish jobs, for MOUSEADMIN_PUBLISH_WORKER=off."""
+    publish_worker()
 
 
 def get_db():
@@ -395,9 +1185,32 @@ def get_db():
     if db is None:
         db = g._database = sqlite3.connect(DATABASE)
         db.row_factory = sqlite3.Row
+        migrations.configure_connection(db)
     return db
 
 
+def migrate():
+    """
+    Apply new schema migrations, then store the paths of entries missing
+    them, which need the app to render.
+
+    Returns
+    -------
+    applied : list of int
+        The migration versions applied.
+    """
+    applied = migrations.migrate(get_db())
+    fill_missing_entry_paths()
+    return applied
+
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply new schema migrations."""
+    applied = migrate()
+    click.echo(f"Applied migrations: {applied or 'none'}")
+
+
 class InputType(ABC):
     KEY = NotImplemented
 
@@ -413,6 +1226,11 @@ class InputType(ABC):
     def from_form_value(self, form_value):
         return form_value.strip()
 
+    def from_import_value(self, field, value):
+        # value as read from an import file; raise ValueError if invalid.
+        # null is taken as an empty form field
+        return self.from_form_value("" if value is None else str(value))
+
     @classmethod
     def from_field_type(cls, field_type):
         for subclass in cls.__subclasses__():
@@ -429,6 +1247,13 @@ class InputType(ABC):
         # extra files to generate from form value on save
         return {}
 
+    def extra_files_many(self, values):
+        # extra files for many form values; override to batch the work
+        files = {}
+        for value in values:
+            files |= self.extra_files(value)
+        return files
+
 
 class TextInput(InputType):
     KEY = "text"
@@ -446,26 +1271,64 @@ class ImageURLInput(InputType):
         return f'<input type="text" name="{name}" value="{value}" /> <img class="image-preview" style="display: none">'
 
     def extra_files(self, image_url):
-        thumbnail_max_height_px = 250
-        thumbnail_max_width_px = 250
+        return self.extra_files_many([image_url])
 
-        try:
+    def extra_files_many(self, image_urls):
+        # empty fields, and nulls stored by earlier imports, have no image
+        image_urls = [image_url for image_url in image_urls if image_url]
+        source_hashes = {}
+        for image_url in image_urls:
             if image_url.startswith(NEOCITIES_DOMAIN):
-                result = get_neocities_file(image_url)
-            else:
-                http_result = requests.get(image_url)
-                http_result.raise_for_status()
-                result = http_result.content
-        except requests.exceptions.ConnectionError:
-            return {}
-
-        image = Image.open(io.BytesIO(result))
-        image.thumbnail((thumbnail_max_height_px, thumbnail_max_width_px))
-        image_bytes_io = io.BytesIO()
-        image.save(image_bytes_io, format="png")
-        image_bytes = image_bytes_io.getvalue()
-
-        return {thumbnail(image_url): image_bytes}
+                file_data = neocities_file_data(image_url)
+                source_hashes[image_url] = file_data and file_data.get("sha1_hash")
+
+        with metrics.span("thumbnails"):
+            thumbnails_by_url = thumbnails.ThumbnailPipeline(
+                fetch_image,
+                thumbnail_cache,
+                workers=THUMBNAIL_WORKERS,
+                fetches_per_host=THUMBNAIL_FETCHES_PER_HOST,
+            ).run(image_urls, source_hashes)
+        return {
+            thumbnail(image_url): thumbnail_bytes
+            for image_url, thumbnail_bytes in thumbnails_by_url.items()
+        }
+
+
+def fetch_image(image_url):
+    # runs on the thumbnail pipeline's threads, outside any app context
+    with app.app_context():
+        if image_url.startswith(NEOCITIES_DOMAIN):
+            return get_neocities_file(image_url)
+        http_result = requests.get(image_url)
+        http_result.raise_for_status()
+        return http_result.content
+
+
+@app.cli.command("sync-remote-files")
+def sync_remote_files_command():
+    """List the site's files into the remote file manifest."""
+    listed = manifest.sync(get_db(), get_client())
+    click.echo(f"Listed {listed} files and directories")
+
+
+@app.cli.command("delete-remote-files")
+@click.argument("paths", nargs=-1, required=True)
+def delete_remote_files_command(paths):
+    """Delete PATHS from the site."""
+    result = get_client().delete(*paths)
+    manifest.record_deletes(get_db(), paths)
+    click.echo(json_dumps(result))
+
+
+@app.cli.command("invalidate-thumbnails")
+@click.argument("image_urls", nargs=-1)
+def invalidate_thumbnails_command(image_urls):
+    """Remove cached thumbnails of IMAGE_URLS, or all of them."""
+    removed = 0
+    for image_url in image_urls or [None]:
+        removed += thumbnail_cache.invalidate(image_url)
+    click.echo(f"Removed {removed} thumbnails")
 
 
 class HtmlInput(InputType):
@@ -487,6 +1350,15 @@ class CheckboxInput(InputType):
     def from_form_value(self, form_value):
         return form_value.strip() == "on"
 
+    def from_import_value(self, field, value):
+        if isinstance(value, bool) or value is None:
+            return bool(value)
+        if str(value).strip().lower() in ("on", "true", "yes", "1"):
+            return True
+        if str(value).strip().lower() in ("", "off", "false", "no", "0"):
+            return False
+        raise ValueError(f"{value!r} is not a checkbox value")
+
 
 class SelectInput(InputType):
     KEY = "select"
@@ -503,6 +1375,15 @@ class SelectInput(InputType):
     def from_form_value(self, form_value):
         return form_value.strip()
 
+    def from_import_value(self, field, value):
+        value = super().from_import_value(field, value)
+        options = [
+            str(option) for option in json_loads(field["field_options"]) or [] if option
+        ]
+        if value and options and value not in options:
+            raise ValueError(f"{value!r} is not one of {', '.join(options)}")
+        return value
+
 
 class DateInput(InputType):
     KEY = "date"
@@ -521,6 +1402,12 @@ class DateInput(InputType):
             # Handle invalid date formats gracefully
             return None
 
+    def from_import_value(self, field, value):
+        date_value = super().from_import_value(field, value)
+        if value and date_value is None:
+            raise ValueError(f"{value!r} is not a YYYY-MM-DD date")
+        return date_value
+
 
 @app.teardown_appcontext
 def close_connection(exception):
@@ -564,6 +1451,42 @@ def field_options(field):
     return ", ".join(json_loads(field["field_options"]))
 
 
+def format_search_fields(template):
+    return ", ".join(
+        f"{field_name}:{weight}"
+        for field_name, weight in search_field_weights(template).items()
+    )
+
+
+def form_search_fields(form):
+    """
+    Parse the search fields input, e.g. "title:3, developer, review", into
+    the json stored in Template.search_fields. Fields without a weight get
+    a weight of 1.
+    """
+    field_weights = {}
+    for item in form.get("search_fields", "").split(","):
+        field_name, _, weight = item.partition(":")
+        if not field_name.strip():
+            continue
+        try:
+            weight = float(weight) if weight.strip() else 1
+        except ValueError:
+            weight = 1
+        field_weights[field_name.strip()] = (
+            int(weight) if weight == int(weight) else weight
+        )
+    # not json_dumps: the order matters, the first field titles results
+    return json.dumps(field_weights) if field_weights else None
+
+
+def form_index_page_size(form):
+    index_page_size = form.get("index_page_size", "").strip()
+    if index_page_size.isdigit() and int(index_page_size) > 0:
+        return int(index_page_size)
+    return None
+
+
 @app.route("/templates/new", methods=["GET", "POST"])
 def new_template():
     if request.method == "GET":
@@ -584,10 +1507,12 @@ def new_template():
         index_template = request.form["index_template"]
         entry_path_template = request.form["entry_path_template"]
         entry_template = request.form["entry_template"]
+        index_page_size = form_index_page_size(request.form)
+        search_fields = form_search_fields(request.form)
         cur = db.execute(
             """
-            insert into Template(name, neocities_path, entry_path_template, entry_template, index_template)
-            values(?, ?, ?, ?, ?)
+            insert into Template(name, neocities_path, entry_path_template, entry_template, index_template, index_page_size, search_fields)
+            values(?, ?, ?, ?, ?, ?, ?)
         """,
             (
                 template_name,
@@ -595,6 +1520,8 @@ def new_template():
                 entry_path_template,
                 entry_template,
                 index_template,
+                index_page_size,
+                search_fields,
             ),
         )
         template_id = cur.lastrowid
@@ -636,14 +1563,27 @@ def update_template(template_id: int):
     ]:
         return "Duplicate template name not allowed", 400
 
+    old_template = db.execute(
+        "SELECT * FROM Template where id=?", (template_id,)
+    ).fetchone()
+    old_fields = {
+        (field["field_name"], field["field_type"])
+        for field in db.execute(
+            "SELECT field_name, field_type FROM TemplateField where template_id=?",
+            (template_id,),
+        ).fetchall()
+    }
+
     neocities_path = request.form["neocities_path"]
     index_template = request.form["index_template"]
     entry_path_template = request.form["entry_path_template"]
     entry_template = request.form["entry_template"]
+    index_page_size = form_index_page_size(request.form)
+    search_fields = form_search_fields(request.form)
     cur = db.execute(
         """
            UPDATE Template
-           SET name=?, neocities_path=?, entry_path_template=?, entry_template=?, index_template=?
+           SET name=?, neocities_path=?, entry_path_template=?, entry_template=?, index_template=?, index_page_size=?, search_fields=?
            WHERE id=?
     """,
         (
@@ -652,6 +1592,8 @@ def update_template(template_id: int):
             entry_path_template,
             entry_template,
             index_template,
+            index_page_size,
+            search_fields,
             template_id,
         ),
     )
@@ -676,11 +1618,63 @@ def update_template(template_id: int):
             if field_name.strip()
         ],
     )
+    fields = {
+        (field_name, field_type)
+        for field_name, field_type in zip(
+            request.form.getlist("field_name"), request.form.getlist("field_type")
+        )
+        if field_name.strip()
+    }
+    if entry_path_template != old_template["entry_path_template"] or {
+        field_name for field_name, _ in fields
+    } != {field_name for field_name, _ in old_fields}:
+        try:
+            update_entry_paths(template_id)
+        except sqlite3.IntegrityError:
+            db.rollback()
+            return "Entry path template gives two entries the same path", 400
+    template = db.execute(
+        "SELECT * FROM Template where id=?", (template_id,)
+    ).fetchone()
     db.commit()
-    upload_entries(template_id=template_id)
+    forget_compiled_templates(template_id)
+    publish_kind = template_update_publish_kind(
+        old_template, template, old_fields, fields
+    )
+    if publish_kind is not None:
+        enqueue_publish(template_id=template_id, kind=publish_kind)
     return redirect("/templates")
 
 
+def template_update_publish_kind(old_template, template, old_fields, fields):
+    """
+    Work out what has to be republished after a template update, from the
+    Template rows and the (field_name, field_type) sets before and after.
+
+    Returns
+    -------
+    kind : str or None
+        The publish job kind (see enqueue_publish), or None when nothing
+        that is published changed.
+    """
+
+    def changed(*columns):
+        return any(old_template[column] != template[column] for column in columns)
+
+    # entries move, or their variables and extra files change
+    if changed("neocities_path", "entry_path_template") or fields != old_fields:
+        return "entries"
+    if changed("entry_template") and changed(
+        "index_template", "index_page_size", "search_fields"
+    ):
+        return "entries"
+    if changed("entry_template"):
+        return "entry_pages"
+    if changed("index_template", "index_page_size", "search_fields"):
+        return "index"
+    return None
+
+
 @app.route("/templates/<template_id>/delete", methods=["POST"])
 def delete_template(template_id: int):
     db = get_db()
@@ -710,60 +1704,173 @@ def template_edit(template_id):
         template=template,
         fields=fields,
         field_options=field_options,
+        search_fields=format_search_fields,
         input_types=InputType.all(),
     )
 
 
-def render_entry_path(template_entry_id):
-    db = get_db()
-    entry = db.execute(
-        "SELECT * FROM TemplateEntry where id=?", (str(template_entry_id),)
-    ).fetchone()
-    template = db.execute(
-        "SELECT * FROM Template where id=?", (str(entry["template_id"]),)
-    ).fetchone()
-    template_variables = get_template_variables(template_entry_id)
-    entry_path = render_template_string(
-        template["entry_path_template"], **TEMPLATE_GLOBALS, **template_variables
-    )
-    return dict(
-        entry_template=template["entry_template"],
-        entry_path=entry_path,
-        template_variables=template_variables,
+def entry_path_exists(*, db, template_id, entry_path, template_entry_id=None):
+    return (
+        db.execute(
+            "select 1 from TemplateEntry where template_id=? and entry_path=? and id is not ?",
+            (str(template_id), entry_path, template_entry_id),
+        ).fetchone()
+        is not None
     )
 
 
-def render_entry(template_entry_id):
-    rendered = render_entry_path(template_entry_id)
-    entry_template = rendered["entry_template"]
-    template_variables = rendered["template_variables"]
-    entry_html = render_template_string(
-        entry_template, **TEMPLATE_GLOBALS, **template_variables
-    )
-    return dict(
-        rendered,
-        entry_html=entry_html,
+def update_entry_paths(template_id):
+    """
+    Re-render and store the entry path of every entry in a template, e.g.
+    after its entry_path_template changed. Raises sqlite3.IntegrityError if
+    two entries end up with the same path; the caller commits.
+    """
+    db = get_db()
+    entry_paths = [
+        (entry["entry_path"], entry["id"])
+        for entry in get_template_entries(template_id, stored_paths=False)
+    ]
+    db.execute(
+        "UPDATE TemplateEntry SET entry_path=NULL WHERE template_id=?",
+        (str(template_id),),
     )
+    db.executemany("UPDATE TemplateEntry SET entry_path=? WHERE id=?", entry_paths)
 
 
-def entry_path_exists(*, db, template_id, form, template_entry_id=None):
-    template = db.execute(
-        "SELECT * FROM Template where id=?", (str(template_id),)
-    ).fetchone()
-    path = render_template_string(
-        template["entry_path_template"], **TEMPLATE_GLOBALS, **form
-    )
-    template_entry_ids = map(
-        lambda x: x["id"],
-        db.execute(
-            "select id from TemplateEntry where template_id = ? and id != ?",
-            (str(template_id), str(template_entry_id)),
-        ),
+def fill_missing_entry_paths():
+    """
+    Store the paths of entries that have none, as entries added before
+    paths were stored do, so the duplicate path check sees them. An entry
+    whose path another entry already has is left without one and logged.
+    """
+    db = get_db()
+    template_ids = [
+        row["template_id"]
+        for row in db.execute(
+            "SELECT DISTINCT template_id FROM TemplateEntry WHERE entry_path IS NULL"
+        ).fetchall()
+    ]
+    for template_id in template_ids:
+        template_entries = get_template_entries(template_id, stored_paths=False)
+        stored_paths = dict(
+            db.execute(
+                "SELECT id, entry_path FROM TemplateEntry WHERE template_id=?",
+                (str(template_id),),
+            ).fetchall()
+        )
+        taken = {path for path in stored_paths.values() if path is not None}
+        entry_paths = []
+        for entry in template_entries:
+            if stored_paths[entry["id"]] is not None:
+                continue
+            if entry["entry_path"] in taken:
+                logging.warning(
+                    f"Entry {entry['id']} has the same path as another entry, "
+                    f"{entry['entry_path']}; change one of them"
+                )
+                continue
+            taken.add(entry["entry_path"])
+            entry_paths.append((entry["entry_path"], entry["id"]))
+        db.executemany("UPDATE TemplateEntry SET entry_path=? WHERE id=?", entry_paths)
+        logging.info(f"Stored {len(entry_paths)} entry paths of template {template_id}")
+    db.commit()
+
+
+@app.cli.command("update-entry-paths")
+def update_entry_paths_command():
+    """Store the rendered entry path of every entry."""
+    db = get_db()
+    for template in db.execute("SELECT id FROM Template").fetchall():
+        update_entry_paths(template["id"])
+    db.commit()
+
+
+def form_value_jsons(fields, form):
+    """
+    Map each submitted field name to the JSON its value is stored as.
+    """
+    field_by_name = {field["field_name"]: field for field in fields}
+    return {
+        field_name: json_dumps(
+            InputType.from_field_type(
+                field_by_name[field_name]["field_type"]
+            ).from_form_value(field_value)
+        )
+        for field_name, field_value in form.items()
+    }
+
+
+def import_value_jsons(fields, values):
+    """
+    Map each field name in values, an object read from JSON, to the JSON
+    its value is stored as. Raises ValueError for unknown fields and
+    invalid values.
+    """
+    if not isinstance(values, dict):
+        raise ValueError("expected an object of field values")
+    field_by_name = {field["field_name"]: field for field in fields}
+    value_jsons = {}
+    for field_name, value in values.items():
+        if field_name not in field_by_name:
+            raise ValueError(f"unknown field {field_name!r}")
+        field = field_by_name[field_name]
+        try:
+            value_jsons[field_name] = json_dumps(
+                InputType.from_field_type(field["field_type"]).from_import_value(
+                    field, value
+                )
+            )
+        except ValueError as e:
+            raise ValueError(f"{field_name}: {e}")
+    return value_jsons
+
+
+def insert_entries(db, template_id, entries):
+    """
+    Insert entries of a template with executemany. Run it in a transaction
+    the caller commits, as the new ids follow the current largest one.
+
+    Parameters
+    ----------
+    entries : list of tuple (str or None, str, dict)
+        The timestamp (now when None), entry path and {field name: value
+        JSON} of each entry.
+
+    Returns
+    -------
+    template_entry_ids : list of int
+    """
+    first_id = db.execute(
+        "SELECT coalesce(max(id), 0) + 1 FROM TemplateEntry"
+    ).fetchone()[0]
+    template_entry_ids = list(range(first_id, first_id + len(entries)))
+    db.executemany(
+        """
+        INSERT INTO TemplateEntry(id, timestamp, last_updated, template_id, entry_path)
+        VALUES (?, coalesce(?, current_timestamp), ?, ?, ?)
+    """,
+        [
+            (template_entry_id, timestamp, datetime.now(), str(template_id), entry_path)
+            for template_entry_id, (timestamp, entry_path, _) in zip(
+                template_entry_ids, entries
+            )
+        ],
     )
-    return path in (
-        render_entry(template_entry_id)["entry_path"]
-        for template_entry_id in template_entry_ids
+    db.executemany(
+        """
+        INSERT INTO TemplateFieldValue(template_entry_id, template_field_name, value_json)
+        VALUES (?, ?, ?)
+    """,
+        [
+            (template_entry_id, field_name, value_json)
+            for template_entry_id, (_, _, value_jsons) in zip(
+                template_entry_ids, entries
+            )
+            for field_name, value_json in value_jsons.items()
+        ],
     )
+    search.index_entries(db, template_entry_ids)
+    return template_entry_ids
 
 
 @app.route("/templates/<int:template_id>", methods=["GET"])
@@ -775,19 +1882,43 @@ def template(template_id):
     fields = db.execute(
         "SELECT * FROM TemplateField where template_id=?", str(template_id)
     ).fetchall()
-    template_entries = db.execute(
-        "SELECT * FROM TemplateEntry where template_id=? ORDER BY timestamp DESC",
-        str(template_id),
-    ).fetchall()
     return render_template(
         "template.html",
         **TEMPLATE_GLOBALS,
         template=template,
         fields=fields,
-        template_entries=[
-            dict(entry, **render_entry_path(entry["id"])) for entry in template_entries
-        ],
+        # the page only lists paths; searching is done by the endpoint below
+        template_entries=db.execute(
+            """
+            SELECT id, entry_path FROM TemplateEntry WHERE template_id=?
+            ORDER BY timestamp DESC, id
+        """,
+            (str(template_id),),
+        ).fetchall(),
+    )
+
+
+@app.route("/templates/<int:template_id>/entries/search", methods=["GET"])
+def search_template_entries(template_id):
+    """
+    Entries of a template matching ?q=, best first, optionally only
+    searching the fields given as ?field= and at most ?limit= of them.
+    """
+    entries = search.search_entries(
+        get_db(),
+        request.args.get("q", ""),
+        template_id=template_id,
+        field_names=request.args.getlist("field"),
+        limit=request.args.get("limit", 50, type=int),
     )
+    return {"entries": entries}
+
+
+@app.cli.command("rebuild-search-index")
+def rebuild_search_index_command():
+    """Reindex every field value for entry search."""
+    indexed = search.rebuild_index(get_db())
+    click.echo(f"Indexed {indexed} field values")
 
 
 def field_html(field, value=None):
@@ -818,19 +1949,20 @@ def new_template_entry(template_id):
         template = db.execute(
             "SELECT * FROM Template where id=?", str(template_id)
         ).fetchone()
-
-        if entry_path_exists(db=db, template_id=template_id, form=request.form):
-            return "A template entry with this name already exists", 400
-
         fields = db.execute(
             "SELECT * FROM TemplateField where template_id=?", str(template_id)
         ).fetchall()
-        field_by_name = {field["field_name"]: field for field in fields}
+        value_jsons = form_value_jsons(fields, request.form)
+        entry_path, _ = entry_variables(template, value_jsons.items())
+
+        if entry_path_exists(db=db, template_id=template_id, entry_path=entry_path):
+            return "A template entry with this name already exists", 400
+
         template_entry_id = db.execute(
             """
-            INSERT INTO TemplateEntry(last_updated, template_id) values (?, ?)
+            INSERT INTO TemplateEntry(last_updated, template_id, entry_path) values (?, ?, ?)
         """,
-            (datetime.now(), str(template_id)),
+            (datetime.now(), str(template_id), entry_path),
         ).lastrowid
         db.executemany(
             """
@@ -838,20 +1970,17 @@ def new_template_entry(template_id):
             values(?, ?, ?)
         """,
             [
-                (
-                    template_entry_id,
-                    field_by_name[field_name]["field_name"],
-                    json_dumps(
-                        InputType.from_field_type(
-                            field_by_name[field_name]["field_type"]
-                        ).from_form_value(field_value)
-                    ),
-                )
-                for field_name, field_value in request.form.items()
+                (template_entry_id, field_name, value_json)
+                for field_name, value_json in value_jsons.items()
             ],
         )
+        search.index_entries(db, [template_entry_id])
         db.commit()
-        upload_entries(template_entry_id=template_entry_id)
+        enqueue_publish(
+            template_id=template_id,
+            kind="new_entries",
+            template_entry_ids=[template_entry_id],
+        )
         return redirect(f"/templates/{template_id}")
 
 
@@ -877,18 +2006,27 @@ def update_template_entry(template_id, template_entry_id):
             "edit_entry.html", template=template, fields=fields, fields_html=fields_html
         )
     if request.method == "POST":
+        template = db.execute(
+            "SELECT * FROM Template where id=?", str(template_id)
+        ).fetchone()
+        fields = db.execute(
+            "SELECT * FROM TemplateField where template_id=?", str(template_id)
+        ).fetchall()
+        value_jsons = form_value_jsons(fields, request.form)
+        entry_path, _ = entry_variables(template, value_jsons.items())
+
         if entry_path_exists(
             db=db,
             template_id=template_id,
-            form=request.form,
+            entry_path=entry_path,
             template_entry_id=template_entry_id,
         ):
             return "A template entry with this name already exists", 400
 
-        fields = db.execute(
-            "SELECT * FROM TemplateField where template_id=?", str(template_id)
-        ).fetchall()
-        field_by_name = {field["field_name"]: field for field in fields}
+        db.execute(
+            "UPDATE TemplateEntry SET entry_path=?, last_updated=? WHERE id=?",
+            (entry_path, datetime.now(), str(template_entry_id)),
+        )
         db.execute(
             "DELETE FROM TemplateFieldValue where template_entry_id=?",
             (str(template_entry_id),),
@@ -899,23 +2037,25 @@ def update_template_entry(template_id, template_entry_id):
             values(?, ?, ?)
             """,
             [
-                (
-                    template_entry_id,
-                    field_by_name[field_name]["field_name"],
-                    json_dumps(
-                        InputType.from_field_type(
-                            field_by_name[field_name]["field_type"]
-                        ).from_form_value(field_value)
-                    ),
-                )
-                for field_name, field_value in request.form.items()
+                (template_entry_id, field_name, value_json)
+                for field_name, value_json in value_jsons.items()
             ],
         )
+        search.index_entries(db, [template_entry_id])
         db.commit()
-        upload_entries(template_entry_id=template_entry_id)
+        enqueue_publish(template_id=template_id, template_entry_ids=[template_entry_id])
         return redirect(f"/templates/{template_id}")
 
 
+def delete_entries(db, template_entry_ids):
+    """Delete entries and what is stored about them; the caller commits."""
+    params = [(str(template_entry_id),) for template_entry_id in template_entry_ids]
+    db.executemany("DELETE FROM TemplateFieldValue where template_entry_id=?", params)
+    db.executemany("DELETE FROM RenderedEntry where template_entry_id=?", params)
+    db.executemany("DELETE FROM EntrySearchTokens where template_entry_id=?", params)
+    db.executemany("DELETE FROM TemplateEntry where id=?", params)
+
+
 @app.route(
     "/templates/entry/<int:template_entry_id>/delete",
     methods=["POST"],
@@ -925,27 +2065,233 @@ def delete_template_entry(template_entry_id):
     template_entry = db.execute(
         "select * from TemplateEntry where id=?", [str(template_entry_id)]
     ).fetchone()
-    db.execute(
-        "DELETE FROM TemplateFieldValue where template_entry_id=?",
-        [str(template_entry_id)],
-    )
-    db.execute("DELETE FROM TemplateEntry where id=?", [str(template_entry_id)])
+    delete_entries(db, [template_entry_id])
     db.commit()
-    regenerate_index(template_entry["template_id"])
+    enqueue_publish(template_id=template_entry["template_id"], kind="index")
     return "Done", 201
 
 
+@app.route("/templates/<int:template_id>/entries/batch", methods=["POST"])
+def batch_template_entries(template_id):
+    """
+    Create, update and delete many entries of a template in one
+    transaction, then queue a single publish of the changed entries and
+    the index. The JSON body has any of
+
+        {"create": [{field name: value}, ...],
+         "update": [{"id": template entry id, "fields": {field name: value}}, ...],
+         "delete": [template entry id, ...]}
+
+    with values as in an import file. Fields left out of an update keep
+    their values. Nothing changes if any of it is invalid, and the
+    response lists why with status 400.
+    """
+    db = get_db()
+    template = db.execute(
+        "SELECT * FROM Template where id=?", (str(template_id),)
+    ).fetchone()
+    if template is None:
+        return {"errors": [f"No template {template_id}"]}, 404
+    fields = db.execute(
+        "SELECT * FROM TemplateField where template_id=?", (str(template_id),)
+    ).fetchall()
+    batch = request.get_json(silent=True)
+    if not isinstance(batch, dict):
+        return {"errors": ["Expected a JSON object"]}, 400
+    not_lists = [
+        f"{operation} must be a list"
+        for operation in ("create", "update", "delete")
+        if not isinstance(batch.get(operation, []), list)
+    ]
+    if not_lists:
+        return {"errors": not_lists}, 400
+
+    entry_paths = {
+        row["id"]: row["entry_path"]
+        for row in db.execute(
+            "SELECT id, entry_path FROM TemplateEntry where template_id=?",
+            (str(template_id),),
+        ).fetchall()
+    }
+    errors = []
+
+    deletes = []
+    for position, template_entry_id in enumerate(batch.get("delete", [])):
+        if (
+            not isinstance(template_entry_id, int)
+            or template_entry_id not in entry_paths
+            or template_entry_id in deletes
+        ):
+            errors.append(f"delete {position}: no entry {template_entry_id!r}")
+        else:
+            deletes.append(template_entry_id)
+    for template_entry_id in deletes:
+        del entry_paths[template_entry_id]
+
+    updates = {}
+    for position, update in enumerate(batch.get("update", [])):
+        try:
+            template_entry_id = update["id"]
+            if template_entry_id not in entry_paths or template_entry_id in updates:
+                raise ValueError(f"no entry {template_entry_id!r}")
+            updates[template_entry_id] = import_value_jsons(fields, update["fields"])
+        except (ValueError, KeyError, TypeError) as e:
+            errors.append(f"update {position}: {e}")
+
+    # updated entries keep the stored values of fields not sent
+    stored_values = db.execute(
+        """
+        SELECT template_entry_id, template_field_name, value_json
+        FROM TemplateFieldValue
+        WHERE template_entry_id IN (SELECT value FROM json_each(?))
+        ORDER BY template_entry_id
+    """,
+        (json_dumps(list(updates)),),
+    ).fetchall()
+    for template_entry_id, values in groupby(
+        stored_values, key=lambda row: row["template_entry_id"]
+    ):
+        updates[template_entry_id] = {
+            **{row["template_field_name"]: row["value_json"] for row in values},
+            **updates[template_entry_id],
+        }
+    for template_entry_id, value_jsons in updates.items():
+        entry_paths[template_entry_id], _ = entry_variables(
+            template, value_jsons.items()
+        )
+
+    creates = []
+    for position, values in enumerate(batch.get("create", [])):
+        try:
+            value_jsons = import_value_jsons(fields, values)
+        except ValueError as e:
+            errors.append(f"create {position}: {e}")
+            continue
+        entry_path, _ = entry_variables(template, value_jsons.items())
+        creates.append((None, entry_path, value_jsons))
+
+    # entries without a stored path (see fill_missing_entry_paths) clash with none
+    paths = [
+        path
+        for path in [*entry_paths.values(), *(path for _, path, _ in creates)]
+        if path is not None
+    ]
+    errors += [
+        f"more than one entry has the path {entry_path!r}"
+        for entry_path in sorted({path for path in paths if paths.count(path) > 1})
+    ]
+    if errors:
+        return {"errors": errors}, 400
+
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        delete_entries(db, deletes)
+        # clear updated paths first, so entries can swap paths
+        db.executemany(
+            "UPDATE TemplateEntry SET entry_path=NULL WHERE id=?",
+            [(str(template_entry_id),) for template_entry_id in updates],
+        )
+        db.executemany(
+            "UPDATE TemplateEntry SET entry_path=?, last_updated=? WHERE id=?",
+            [
+                (entry_paths[template_entry_id], datetime.now(), str(template_entry_id))
+                for template_entry_id in updates
+            ],
+        )
+        db.executemany(
+            "DELETE FROM TemplateFieldValue where template_entry_id=?",
+            [(str(template_entry_id),) for template_entry_id in updates],
+        )
+        db.executemany(
+            """
+            insert into TemplateFieldValue(template_entry_id, template_field_name, value_json)
+            values(?, ?, ?)
+            """,
+            [
+                (template_entry_id, field_name, value_json)
+                for template_entry_id, value_jsons in updates.items()
+                for field_name, value_json in value_jsons.items()
+            ],
+        )
+        search.index_entries(db, updates)
+        created = insert_entries(db, template_id, creates)
+        db.commit()
+    except sqlite3.IntegrityError:
+        db.rollback()
+        return {"errors": ["An entry path was taken by another change"]}, 409
+    except Exception:
+        db.rollback()
+        raise
+
+    published = [*created, *updates]
+    if created or deletes:
+        # other entries moved on the index, so all of its pages change
+        enqueue_publish(
+            template_id=template_id, kind="new_entries", template_entry_ids=published
+        )
+    elif updates:
+        enqueue_publish(template_id=template_id, template_entry_ids=published)
+    return {"created": created, "updated": list(updates), "deleted": deletes}
+
+
 @app.route("/templates/<int:template_id>/entry/preview", methods=["POST"])
 def preview_template(template_id):
     db = get_db()
     template = db.execute(
         "SELECT * FROM Template where id=?", str(template_id)
     ).fetchone()
-    return render_template_string(
-        template["entry_template"], **TEMPLATE_GLOBALS, **request.form
+    return render_template_column(
+        template, "entry_template", **TEMPLATE_GLOBALS, **request.form
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    client_stats = metrics.Counter(
+        "mouseadmin_client_events_total",
+        "NeoCities client requests, retries, throttled and failed responses.",
+    )
+    for event, count in getattr(get_client(), "stats", {}).items():
+        if event in ("requests", "retries", "throttled", "failures"):
+            client_stats.inc(count, event=event)
+    return Response(
+        metrics.REGISTRY.render([client_stats]),
+        mimetype="text/plain; version=0.0.4",
+    )
+
+
+@app.route("/publishes", methods=["GET"])
+def publishes():
+    db = get_db()
+    jobs = db.execute("""
+        SELECT PublishJob.*, Template.name AS template_name
+        FROM PublishJob
+        LEFT JOIN Template ON Template.id=PublishJob.template_id
+        ORDER BY PublishJob.id DESC
+        LIMIT 100
+    """).fetchall()
+    return render_template(
+        "publishes.html",
+        jobs=jobs,
+        seconds_between=seconds_between,
+        json_loads=json_loads,
+    )
+
+
+def seconds_between(start, end):
+    if not start or not end:
+        return ""
+    return round(
+        (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds(),
+        1,
     )
 
 
 @app.route("/", methods=["GET"])
 def cms_home():
     return render_template("index.html")
+
+
+if DATABASE and os.getenv("MOUSEADMIN_MIGRATE_ON_STARTUP", "1") == "1":
+    with app.app_context():
+        migrate()
@@ -0,0 +1,217 @@
+"""
+The mouseadmin command: the app's flask commands, plus bulk import and
+export of template entries as JSON or NDJSON.
+
+\b
+    mouseadmin import "Game reviews" reviews.ndjson
+    mouseadmin export "Game reviews" -o reviews.ndjson
+"""
+
+import json
+import sys
+
+import click
+from flask.cli import FlaskGroup
+
+from mouseadmin.app import (
+    app,
+    enqueue_publish,
+    entry_variables,
+    get_db,
+    get_template_entries,
+    import_value_jsons,
+    insert_entries,
+)
+
+# errors listed before an import gives up on listing them
+MAX_REPORTED_ERRORS = 20
+
+# read_records' record for an ndjson line that is not JSON
+INVALID_JSON = object()
+
+
+def file_format(filename, format):
+    if format:
+        return format
+    if filename.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return "json"
+
+
+def find_template(db, template):
+    """Look a template up by id or name, exiting if there is none."""
+    row = db.execute(
+        "SELECT * FROM Template WHERE name=? OR CAST(id AS TEXT)=?",
+        (template, template),
+    ).fetchone()
+    if row is None:
+        raise click.ClickException(f"No template {template!r}")
+    return row
+
+
+def read_records(file, format):
+    """
+    Yields
+    ------
+    record : tuple (int, dict)
+        The line number (ndjson) or position (json) of each record, and
+        the record, or INVALID_JSON for an ndjson line that is not JSON.
+    """
+    if format == "ndjson":
+        for line_number, line in enumerate(file, 1):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = INVALID_JSON
+                yield line_number, record
+    else:
+        try:
+            records = json.load(file)
+        except ValueError as e:
+            raise click.ClickException(f"Nothing imported, invalid JSON: {e}")
+        if not isinstance(records, list):
+            raise click.ClickException("Expected a JSON list of entries")
+        yield from enumerate(records, 1)
+
+
+def import_entries(db, template, records):
+    """
+    Validate records and insert them as entries of template, in one
+    transaction. Nothing is inserted if any record is invalid.
+
+    Each record is either {field name: value}, or an exported entry with
+    the values under "fields" and optionally a "timestamp", checked by
+    import_value_jsons.
+
+    Returns
+    -------
+    template_entry_ids : list of int
+    """
+    fields = db.execute(
+        "SELECT * FROM TemplateField where template_id=?", (template["id"],)
+    ).fetchall()
+    entry_paths = {
+        row["entry_path"]
+        for row in db.execute(
+            "SELECT entry_path FROM TemplateEntry where template_id=?",
+            (template["id"],),
+        ).fetchall()
+    }
+
+    entries = []
+    errors = []
+    for number, record in records:
+        if record is INVALID_JSON:
+            errors.append(f"entry {number}: invalid JSON")
+            continue
+        if isinstance(record, dict) and isinstance(record.get("fields"), dict):
+            values, timestamp = record["fields"], record.get("timestamp")
+        else:
+            values, timestamp = record, None
+        try:
+            value_jsons = import_value_jsons(fields, values)
+            entry_path, _ = entry_variables(template, value_jsons.items())
+            if entry_path in entry_paths:
+                raise ValueError(f"an entry with the path {entry_path!r} exists")
+        except ValueError as e:
+            errors.append(f"entry {number}: {e}")
+            continue
+        entry_paths.add(entry_path)
+        entries.append((timestamp, entry_path, value_jsons))
+
+    if errors:
+        shown = errors[:MAX_REPORTED_ERRORS]
+        if len(errors) > len(shown):
+            shown.append(f"... and {len(errors) - len(shown)} more")
+        raise click.ClickException(
+            "Nothing imported, invalid entries:\n" + "\n".join(shown)
+        )
+
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        template_entry_ids = insert_entries(db, template["id"], entries)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return template_entry_ids
+
+
+def create_app():
+    return app
+
+
+@click.group(cls=FlaskGroup, create_app=create_app, help=__doc__)
+def cli():
+    pass
+
+
+@cli.command("import")
+@click.argument("template")
+@click.argument("file", type=click.File("r"), default="-")
+@click.option(
+    "--format", type=click.Choice(["json", "ndjson"]), help="Default: by extension."
+)
+@click.option("--publish/--no-publish", default=True, help="Queue a publish after.")
+def import_command(template, file, format, publish):
+    """
+    Add the entries in FILE (stdin by default) to TEMPLATE, a template
+    name or id.
+    """
+    db = get_db()
+    template = find_template(db, template)
+    template_entry_ids = import_entries(
+        db, template, read_records(file, file_format(file.name, format))
+    )
+    click.echo(f"Imported {len(template_entry_ids)} entries", err=True)
+    if publish and template_entry_ids:
+        enqueue_publish(
+            template_id=template["id"],
+            kind="new_entries",
+            template_entry_ids=template_entry_ids,
+        )
+        click.echo("Queued a publish of the new entries", err=True)
+
+
+@cli.command("export")
+@click.argument("template")
+@click.option("-o", "--output", type=click.File("w"), default="-")
+@click.option(
+    "--format", type=click.Choice(["json", "ndjson"]), help="Default: by extension."
+)
+def export_command(template, output, format):
+    """
+    Write the entries of TEMPLATE, a template name or id, newest first.
+    """
+    template = find_template(get_db(), template)
+    format = file_format(output.name, format)
+    if format == "json":
+        output.write("[\n")
+    for position, entry in enumerate(get_template_entries(template["id"])):
+        fields = dict(entry["template_variables"])
+        fields.pop("neocities_path")
+        record = json.dumps(
+            dict(
+                id=entry["id"],
+                timestamp=entry["timestamp"],
+                last_updated=entry["last_updated"],
+                entry_path=entry["entry_path"],
+                fields=fields,
+            ),
+            default=str,
+        )
+        if format == "json":
+            output.write(("  " if position == 0 else ",\n  ") + record)
+        else:
+            output.write(record + "\n")
+    if format == "json":
+        output.write("\n]\n")
+
+
+def main():
+    cli(prog_name="mouseadmin")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import tempfile
+
+SIDECAR_SUFFIX = ".sha1.json"
+
+
+def write_atomic(path, content):
+    """
+    Write content (bytes) to path through a temporary file renamed into
+    place, so other processes never read a partial file.
+    """
+    with tempfile.NamedTemporaryFile(
+        dir=os.path.dirname(path) or ".", delete=False, suffix=".tmp"
+    ) as f:
+        f.write(content)
+    os.replace(f.name, path)
+
+
+class HashedFileCache:
+    """
+    Local copies of site files, each with a sidecar file recording its
+    SHA1 hash and the size and mtime it was hashed at.
+
+    Checking a copy against a hash is then a stat and a small read, and the
+    copy itself is only read when it matches and is returned. A copy
+    changed behind the cache's back no longer matches its sidecar's size or
+    mtime and is hashed again.
+    """
+
+    def __init__(self, base_dir="cache/site"):
+        self.base_dir = base_dir
+
+    def path(self, site_path):
+        return os.path.join(self.base_dir, site_path.strip("/"))
+
+    def file_hash(self, site_path):
+        """
+        Returns
+        -------
+        sha1_hash : str or None
+            The hash of the local copy of site_path, or None if there is no
+            copy.
+        """
+        path = self.path(site_path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        try:
+            with open(path + SIDECAR_SUFFIX) as f:
+                sidecar = json.load(f)
+            if (sidecar["size"], sidecar["mtime_ns"]) == (
+                stat.st_size,
+                stat.st_mtime_ns,
+            ):
+                return sidecar["sha1_hash"]
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha1.update(chunk)
+        self._write_sidecar(path, stat, sha1.hexdigest())
+        return sha1.hexdigest()
+
+    def get(self, site_path, sha1_hash):
+        """
+        Returns
+        -------
+        file_bytes : bytes or None
+            The local copy of site_path, or None if there is none or its
+            hash is not sha1_hash.
+        """
+        if self.file_hash(site_path) != sha1_hash:
+            return None
+        try:
+            with open(self.path(site_path), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, site_path, file_bytes):
+        """Store file_bytes as the local copy of site_path."""
+        path = self.path(site_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, file_bytes)
+        self._write_sidecar(path, os.stat(path), hashlib.sha1(file_bytes).hexdigest())
+
+    def _write_sidecar(self, path, stat, sha1_hash):
+        sidecar = dict(
+            size=stat.st_size, mtime_ns=stat.st_mtime_ns, sha1_hash=sha1_hash
+        )
+        write_atomic(path + SIDECAR_SUFFIX, json.dumps(sidecar).encode("utf-8"))
@@ -1,9 +1,17 @@
+from email.utils import formatdate
+import hashlib
 import json
 import os
+import random
+import shutil
+import threading
+import time
+
+from mouseadmin.neocities import NeoCities, wait_to_retry
 
 
 class FileClient:
-    def __init__(self, base_dir="mock_data"):
+    def __init__(self, base_dir="mock_data", options={}):
         """
         Initialize the FileClient with a base directory for mock data.
 
@@ -11,9 +19,50 @@ class FileClient:
         ----------
         base_dir : str
             The directory where mock data will be stored.
+        options : dict
+            Optional misbehaviour, to try publishing against a slow or
+            unreliable site. Throttled and failed calls are retried like
+            NeoCities retries them, and raise
+            NeoCities.InvalidRequestError once out of retries.
+
+            latency : float or tuple (float, float)
+                Seconds each call takes, or a range to pick from at random.
+            rate_limit : float
+                Calls allowed per second; calls beyond it are answered with
+                status 429, and retried once the rate allows.
+            failure_rate : float
+                Probability of a call being answered with status 500.
+            seed : int
+                Seed for the random latency and failures.
+            max_retries : int
+                Times a call is retried before giving up, default 4
+            backoff : float
+                Seconds before the first retry of a failure, doubling after
+                each one, default 1
         """
         self.base_dir = os.path.abspath(base_dir)
         os.makedirs(base_dir, exist_ok=True)
+        self.latency = options.get("latency", 0)
+        self.rate_limit = options.get("rate_limit")
+        self.failure_rate = options.get("failure_rate", 0)
+        self.random = random.Random(options.get("seed"))
+        self.max_retries = options.get("max_retries", 4)
+        self.backoff = options.get("backoff", 1)
+
+        # {path: (mtime_ns, size, sha1 hash)}, so unchanged files are not
+        # read again to be hashed
+        self.hashes = {}
+        self.lock = threading.Lock()
+        self.call_times = []
+        self.stats_lock = threading.Lock()
+        self.stats = dict(
+            requests=0,
+            retries=0,
+            throttled=0,
+            failures=0,
+            latency_seconds=0.0,
+            max_latency_seconds=0.0,
+        )
 
     def info(self, site_name=""):
         """
@@ -29,6 +78,7 @@ class FileClient:
         dict
             Mock site info.
         """
+        self._request("info")
         file_path = os.path.join(self.base_dir, f"{site_name}_info.json")
         if os.path.exists(file_path):
             with open(file_path, "r") as f:
@@ -37,7 +87,8 @@ class FileClient:
 
     def listitems(self, site_name=""):
         """
-        List mock files for a site.
+        List mock files for a site, recursively, in the same format as
+        NeoCities.listitems.
 
         Parameters
         ----------
@@ -49,15 +100,40 @@ class FileClient:
         dict
             List of files and metadata.
         """
+        self._request("list")
         dir_path = os.path.join(self.base_dir, site_name)
-        if os.path.exists(dir_path):
-            files = [
-                {"path": f, "size": os.path.getsize(os.path.join(dir_path, f))}
-                for f in os.listdir(dir_path)
-                if os.path.isfile(os.path.join(dir_path, f))
-            ]
-            return {"files": files}
-        return {"error": "No files found"}
+        if not os.path.exists(dir_path):
+            return {"error": "No files found"}
+
+        files = []
+        seen = set()
+        directories = [dir_path]
+        while directories:
+            with os.scandir(directories.pop()) as dir_entries:
+                for dir_entry in dir_entries:
+                    path = os.path.relpath(dir_entry.path, dir_path).replace(
+                        os.sep, "/"
+                    )
+                    stat = dir_entry.stat()
+                    item = dict(
+                        path=path,
+                        is_directory=dir_entry.is_dir(),
+                        updated_at=formatdate(stat.st_mtime),
+                        created_at=formatdate(stat.st_ctime),
+                    )
+                    if dir_entry.is_dir():
+                        directories.append(dir_entry.path)
+                    else:
+                        item["size"] = stat.st_size
+                        item["sha1_hash"] = self._sha1_hash(dir_entry.path, stat)
+                        seen.add(dir_entry.path)
+                    files.append(item)
+
+        with self.lock:
+            for path in list(self.hashes):
+                if path.startswith(dir_path) and path not in seen:
+                    del self.hashes[path]
+        return {"result": "success", "files": sorted(files, key=lambda f: f["path"])}
 
     def delete(self, *filenames):
         """
@@ -66,17 +142,21 @@ class FileClient:
         Parameters
         ----------
         filenames : str
-            The names of the files to delete.
+            The names of the files or directories to delete.
 
         Returns
         -------
         dict
             Result of deletion operation.
         """
+        self._request("delete")
         deleted = []
         for filename in filenames:
-            file_path = os.path.join(self.base_dir, filename)
-            if os.path.exists(file_path):
+            file_path = os.path.join(self.base_dir, filename.lstrip("/"))
+            if os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+                deleted.append(filename)
+            elif os.path.exists(file_path):
                 os.remove(file_path)
                 deleted.append(filename)
         return {"deleted": deleted, "not_found": list(set(filenames) - set(deleted))}
@@ -87,20 +167,103 @@ class FileClient:
 
         Parameters
         ----------
-        filenames : tuple (str, str)
-            Pairs of (local file path, mock server file name).
+        filenames : tuple (str or bytes or file, str)
+            Pairs of (local file path, mock server file name), where the
+            local file path may instead be the file's content or a binary
+            file object.
 
         Returns
         -------
         dict
             Result of upload operation.
         """
+        self._request("upload")
         uploaded = []
-        for local_path, server_name in filenames:
+        for source, server_name in filenames:
             dest_path = os.path.join(self.base_dir, server_name.lstrip("/"))
             os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-            with open(local_path, "rb") as src:
-                with open(dest_path, "wb") as dest:
-                    dest.write(src.read())
+            if isinstance(source, (bytes, bytearray)):
+                content = source
+            elif hasattr(source, "read"):
+                content = source.read()
+            else:
+                with open(source, "rb") as src:
+                    content = src.read()
+            with open(dest_path, "wb") as dest:
+                dest.write(content)
+            stat = os.stat(dest_path)
+            with self.lock:
+                self.hashes[dest_path] = (
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    hashlib.sha1(content).hexdigest(),
+                )
             uploaded.append(server_name)
         return {"uploaded": uploaded}
+
+    def _sha1_hash(self, path, stat):
+        with self.lock:
+            cached = self.hashes.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha1.update(chunk)
+        sha1_hash = sha1.hexdigest()
+        with self.lock:
+            self.hashes[path] = (stat.st_mtime_ns, stat.st_size, sha1_hash)
+        return sha1_hash
+
+    def _request(self, method):
+        # retried as NeoCities._request retries
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._call()
+            except NeoCities.InvalidRequestError as e:
+                if attempt == self.max_retries:
+                    raise
+                if e.status_code == 429:
+                    delay = self._retry_after()
+                else:
+                    delay = self.backoff * 2**attempt
+            wait_to_retry(self, method, attempt, delay)
+
+    def _retry_after(self):
+        # seconds until the oldest call leaves the rate limit's window
+        with self.lock:
+            if not self.call_times:
+                return 0
+            return max(1 - (time.monotonic() - self.call_times[0]), 0)
+
+    def _call(self):
+        # behave like a NeoCities API request, as configured by options
+        if isinstance(self.latency, (tuple, list)):
+            latency = self.random.uniform(*self.latency)
+        else:
+            latency = self.latency
+        if latency:
+            time.sleep(latency)
+
+        with self.lock:
+            now = time.monotonic()
+            throttled = False
+            if self.rate_limit:
+                self.call_times = [t for t in self.call_times if now - t < 1]
+                throttled = len(self.call_times) >= self.rate_limit
+                if not throttled:
+                    self.call_times.append(now)
+            failed = not throttled and self.random.random() < self.failure_rate
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["latency_seconds"] += latency
+            self.stats["max_latency_seconds"] = max(
+                self.stats["max_latency_seconds"], latency
+            )
+            self.stats["throttled"] += throttled
+            self.stats["failures"] += throttled or failed
+
+        if throttled:
+            raise NeoCities.InvalidRequestError(429, "Rate limit exceeded")
+        if failed:
+            raise NeoCities.InvalidRequestError(500, "Injected failure")
@@ -0,0 +1,177 @@
+"""
+A copy of the site's file list in the RemoteFile table, so files can be
+looked up by path without listing the whole site each time.
+
+The copy is replaced by a full listing when it is older than the resync
+interval, and kept current in between by recording what is uploaded and
+deleted. Being in the database, it is shared by every process.
+"""
+
+from email.utils import formatdate
+import time
+
+COLUMNS = ("path", "is_directory", "size", "sha1_hash", "updated_at", "created_at")
+
+
+def synced_at(db):
+    row = db.execute("SELECT synced_at FROM RemoteFileSync WHERE id=1").fetchone()
+    return row[0] if row else 0
+
+
+def sync(db, client):
+    """
+    Replace the manifest with the client's full file listing.
+
+    Returns
+    -------
+    files : int
+        The number of files and directories listed.
+    """
+    files = client.listitems().get("files", [])
+    db.execute("DELETE FROM RemoteFile")
+    db.executemany(
+        f"""
+        INSERT OR REPLACE INTO RemoteFile({", ".join(COLUMNS)})
+        VALUES ({", ".join("?" * len(COLUMNS))})
+    """,
+        [
+            (
+                file["path"].strip("/"),
+                bool(file.get("is_directory")),
+                file.get("size"),
+                file.get("sha1_hash"),
+                file.get("updated_at"),
+                file.get("created_at"),
+            )
+            for file in files
+        ],
+    )
+    db.execute(
+        "INSERT OR REPLACE INTO RemoteFileSync(id, synced_at) VALUES (1, ?)",
+        (time.time(),),
+    )
+    db.commit()
+    return len(files)
+
+
+def refresh(db, client, max_age):
+    """
+    Sync the manifest if it was last synced more than max_age seconds ago.
+
+    Returns
+    -------
+    synced : bool
+    """
+    if time.time() - synced_at(db) <= max_age:
+        return False
+    sync(db, client)
+    return True
+
+
+def mark_stale(db):
+    """Have the next refresh sync, e.g. after an upload that failed part way."""
+    db.execute("UPDATE RemoteFileSync SET synced_at=0")
+    db.commit()
+
+
+def get_file(db, path):
+    """
+    Returns
+    -------
+    file : dict or None
+        The file's listing in the NeoCities format, or None if it is not
+        on the site.
+    """
+    row = db.execute(
+        f"SELECT {', '.join(COLUMNS)} FROM RemoteFile WHERE path=?",
+        (path.strip("/"),),
+    ).fetchone()
+    if row is None:
+        return None
+    file = dict(zip(COLUMNS, row))
+    file["is_directory"] = bool(file["is_directory"])
+    return file
+
+
+def file_hashes(db):
+    """
+    Returns
+    -------
+    hashes : dict
+        {path: sha1 hash} of every file on the site.
+    """
+    return dict(
+        db.execute(
+            "SELECT path, sha1_hash FROM RemoteFile WHERE NOT is_directory"
+        ).fetchall()
+    )
+
+
+def file_paths(db, directory):
+    """
+    Returns
+    -------
+    paths : list of str
+        Paths of the files in directory and its subdirectories.
+    """
+    directory = directory.strip("/")
+    return [
+        path
+        for (path,) in db.execute(
+            """
+            SELECT path FROM RemoteFile
+            WHERE NOT is_directory AND path > ? || '/' AND path < ? || '0'
+            ORDER BY path
+        """,
+            (directory, directory),
+        ).fetchall()
+    ]
+
+
+def record_uploads(db, files):
+    """
+    Record files as uploaded, along with the directories they are in.
+
+    Parameters
+    ----------
+    files : dict
+        {path: (size, sha1 hash)} of each uploaded file.
+    """
+    now = formatdate()
+    directories = {
+        "/".join(parts[:depth])
+        for parts in (path.strip("/").split("/") for path in files)
+        for depth in range(1, len(parts))
+    }
+    db.executemany(
+        """
+        INSERT OR IGNORE INTO RemoteFile(path, is_directory, updated_at, created_at)
+        VALUES (?, 1, ?, ?)
+    """,
+        [(directory, now, now) for directory in directories],
+    )
+    db.executemany(
+        """
+        INSERT INTO RemoteFile(path, is_directory, size, sha1_hash, updated_at, created_at)
+        VALUES (?, 0, ?, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET
+            size=excluded.size,
+            sha1_hash=excluded.sha1_hash,
+            updated_at=excluded.updated_at
+    """,
+        [
+            (path.strip("/"), size, sha1_hash, now, now)
+            for path, (size, sha1_hash) in files.items()
+        ],
+    )
+    db.commit()
+
+
+def record_deletes(db, paths):
+    """Record files or directories, and everything in them, as deleted."""
+    # "0" sorts right after "/", so the range is everything under path/
+    db.executemany(
+        "DELETE FROM RemoteFile WHERE path=? OR (path > ? || '/' AND path < ? || '0')",
+        [(path.strip("/"),) * 3 for path in paths],
+    )
+    db.commit()
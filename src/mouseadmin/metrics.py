@@ -0,0 +1,250 @@
+"""
+In-process counters and histograms, exposed in the Prometheus text format,
+plus timing spans that also add up per publish for its log line.
+
+Metrics live in the process that records them: run with the publish
+worker thread (the default) for /metrics to include publishing.
+"""
+
+from contextlib import contextmanager
+import bisect
+import functools
+import math
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    TYPE = NotImplemented
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(sorted(labels.items()))
+
+    def lines(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.TYPE}"
+        with self.lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield from self._sample_lines(labels, value)
+
+
+class Counter(Metric):
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def _sample_lines(self, labels, value):
+        yield f"{self.name}{format_labels(labels)} {format_value(value)}"
+
+
+class Histogram(Metric):
+    TYPE = "histogram"
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            if key not in self.values:
+                self.values[key] = dict(counts=[0] * len(self.buckets), sum=0.0)
+            sample = self.values[key]
+            sample["counts"][bisect.bisect_left(self.buckets, value)] += 1
+            sample["sum"] += value
+
+    def _sample_lines(self, labels, sample):
+        cumulative = 0
+        for bound, count in zip(self.buckets, sample["counts"]):
+            cumulative += count
+            bucket_labels = labels + (("le", format_value(bound)),)
+            yield f"{self.name}_bucket{format_labels(bucket_labels)} {cumulative}"
+        yield f"{self.name}_sum{format_labels(labels)} {format_value(sample['sum'])}"
+        yield f"{self.name}_count{format_labels(labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def counter(self, name, help):
+        return self._add(Counter(name, help))
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, buckets))
+
+    def _add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self, extra_metrics=()):
+        """
+        Returns
+        -------
+        text : str
+            Every metric, in the Prometheus text exposition format.
+        """
+        return "".join(
+            line + "\n"
+            for metric in [*self.metrics, *extra_metrics]
+            for line in metric.lines()
+        )
+
+
+REGISTRY = Registry()
+
+span_seconds = REGISTRY.histogram(
+    "mouseadmin_span_seconds", "Time spent in each step of publishing."
+)
+
+client_request_seconds = REGISTRY.histogram(
+    "mouseadmin_client_request_seconds",
+    "Time taken by NeoCities client calls, including retries.",
+)
+
+client_errors = REGISTRY.counter(
+    "mouseadmin_client_errors_total", "NeoCities client calls that raised."
+)
+
+publish_seconds = REGISTRY.histogram(
+    "mouseadmin_publish_seconds", "Time taken by publish jobs."
+)
+
+publish_jobs = REGISTRY.counter(
+    "mouseadmin_publish_jobs_total", "Publish jobs run, by kind and status."
+)
+
+publish_coalesced = REGISTRY.counter(
+    "mouseadmin_publish_coalesced_total",
+    "Publishes merged into a publish job already queued for their template.",
+)
+
+uploaded_files = REGISTRY.counter(
+    "mouseadmin_uploaded_files_total", "Files uploaded to the site."
+)
+
+uploaded_bytes = REGISTRY.counter(
+    "mouseadmin_uploaded_bytes_total", "Bytes uploaded to the site."
+)
+
+skipped_files = REGISTRY.counter(
+    "mouseadmin_skipped_files_total", "Files not uploaded because they were unchanged."
+)
+
+rate_limit_wait_seconds = REGISTRY.counter(
+    "mouseadmin_rate_limit_wait_seconds_total",
+    "Seconds uploads spent waiting on the upload rate limit.",
+)
+
+collected_spans = threading.local()
+
+
+@contextmanager
+def span(name):
+    """
+    Time a block as span name, adding to the spans being collected on this
+    thread if any.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        span_seconds.observe(seconds, span=name)
+        totals = getattr(collected_spans, "totals", None)
+        if totals is not None:
+            totals[name] = totals.get(name, 0) + seconds
+
+
+def timed(name):
+    """Decorator timing every call of a function as span name."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def collect_spans():
+    """
+    Add up the time spent in each span on this thread while the block
+    runs. Spans may nest, so the totals can add up to more than the block.
+
+    Yields
+    ------
+    totals : dict
+        {span name: seconds}, filled in as spans finish.
+    """
+    previous = getattr(collected_spans, "totals", None)
+    collected_spans.totals = totals = {}
+    try:
+        yield totals
+    finally:
+        collected_spans.totals = previous
+
+
+class InstrumentedClient:
+    """
+    Wraps a NeoCities or FileClient, timing its API calls. Anything else
+    is passed through to the wrapped client.
+    """
+
+    METHODS = ("info", "listitems", "delete", "upload")
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if name not in self.METHODS:
+            return attribute
+
+        @functools.wraps(attribute)
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            except Exception:
+                client_errors.inc(method=name)
+                raise
+            finally:
+                client_request_seconds.observe(time.perf_counter() - start, method=name)
+
+        return call
@@ -0,0 +1,127 @@
+"""
+Versioned schema migrations.
+
+A new database gets schema.sql followed by every file in migrations/,
+applied in order of their numeric names. Applied versions are recorded in
+the Migration table so each one only ever runs once.
+"""
+
+import logging
+import pathlib
+import sqlite3
+
+from mouseadmin import search
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+
+SCHEMA_PATH = ROOT / "schema.sql"
+
+MIGRATIONS_DIR = ROOT / "migrations"
+
+# per-connection settings; journal_mode is stored in the database file itself
+CONNECTION_PRAGMAS = (
+    "PRAGMA busy_timeout = 10000",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -32000",
+)
+
+
+def configure_connection(db):
+    for pragma in CONNECTION_PRAGMAS:
+        db.execute(pragma)
+
+
+def migrations():
+    """
+    Returns
+    -------
+    migrations : list of tuple (int, pathlib.Path)
+        (version, path) of each migration, oldest first.
+    """
+    return sorted(
+        (int(path.stem), path)
+        for path in MIGRATIONS_DIR.glob("*.sql")
+        if path.stem.isdigit()
+    )
+
+
+def split_statements(script):
+    statements = []
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            statements.append(statement)
+            statement = ""
+    if statement.strip():
+        statements.append(statement)
+    return statements
+
+
+def column_names(db, table):
+    return {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+
+
+def run_script(db, script, version):
+    """
+    Run script and record version as applied, in one transaction. Does
+    nothing if another process applied version first.
+    """
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        if db.execute("SELECT 1 FROM Migration WHERE version=?", (version,)).fetchone():
+            db.execute("ROLLBACK")
+            return False
+        for statement in split_statements(script):
+            db.execute(statement)
+        db.execute("INSERT INTO Migration(version) VALUES (?)", (version,))
+        db.execute("COMMIT")
+        return True
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+
+
+def migrate(db):
+    """
+    Bring a database up to date and switch it to WAL mode.
+
+    Databases created before migrations were tracked are detected from
+    their tables: an empty one gets schema.sql first (recorded as version
+    0), and one that already had 001.sql applied by hand is marked as
+    such.
+
+    Returns
+    -------
+    applied : list of int
+        The versions applied.
+    """
+    isolation_level = db.isolation_level
+    db.isolation_level = None
+    # for migrations reindexing field values
+    search.register_functions(db)
+    try:
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("""
+            create table if not exists Migration (
+              version integer primary key,
+              applied_at datetime default current_timestamp
+            )
+        """)
+        applied = []
+        if not column_names(db, "Template"):
+            if run_script(db, SCHEMA_PATH.read_text(), 0):
+                applied.append(0)
+        elif "template_field_id" not in column_names(db, "TemplateFieldValue"):
+            db.execute("INSERT OR IGNORE INTO Migration(version) VALUES (0), (1)")
+        else:
+            db.execute("INSERT OR IGNORE INTO Migration(version) VALUES (0)")
+
+        for version, path in migrations():
+            if run_script(db, path.read_text(), version):
+                logging.info(f"Applied migration {path.name}")
+                applied.append(version)
+        return applied
+    finally:
+        db.isolation_level = isolation_level
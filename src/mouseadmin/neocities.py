@@ -2,18 +2,96 @@
 pulled from https://github.com/neocities/python-neocities
 """
 
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import io
+import logging
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+
+def wait_to_retry(client, method, attempt, delay):
+    """
+    Count and log a retry of a failed request, then wait delay seconds.
+
+    Parameters
+    ----------
+    client : NeoCities or FileClient
+        Anything with max_retries, stats and stats_lock.
+    method : str
+        The API method retried.
+    attempt : int
+        Attempts failed so far, less one.
+    delay : float
+    """
+    logging.warning(
+        f"NeoCities {method} failed, retrying in {delay:.1f}s "
+        f"({attempt + 1}/{client.max_retries})"
+    )
+    with client.stats_lock:
+        client.stats["retries"] += 1
+    time.sleep(delay)
 
 
 class NeoCities:
+    """
+    NeoCities API client.
+
+    Requests share one keep-alive session. Connection errors and 429/5xx
+    responses are retried with exponential backoff, waiting for as long as
+    a Retry-After header asks when there is one.
+
+    Options
+    -------
+    url : str
+        API host, default https://neocities.org
+    timeout : float or tuple (float, float)
+        Seconds to wait for a connection and for a response, default (10, 120)
+    max_retries : int
+        Times a request is retried before giving up, default 4
+    backoff : float
+        Seconds before the first retry, doubling after each one, default 1
+    pool_size : int
+        Connections kept open to the API, default 10
+    """
+
     api_key = None
 
+    RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
     def __init__(self, username=None, password=None, api_key=None, options={}):
         self.auth = (username, password)
         if api_key:
             self.api_key = api_key
         self.options = options
         self.url = options.get("url", "https://neocities.org")
+        self.timeout = options.get("timeout", (10, 120))
+        self.max_retries = options.get("max_retries", 4)
+        self.backoff = options.get("backoff", 1)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=options.get("pool_size", 10)
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if self.api_key:
+            self.session.headers["Authorization"] = "Bearer " + self.api_key
+        else:
+            self.session.auth = self.auth
+
+        self.stats_lock = threading.Lock()
+        self.stats = dict(
+            requests=0,
+            retries=0,
+            throttled=0,
+            failures=0,
+            latency_seconds=0.0,
+            max_latency_seconds=0.0,
+        )
 
     def info(self, site_name=""):
         """
@@ -34,17 +112,7 @@ class NeoCities:
             args = {"sitename": site_name}
         else:
             args = None
-        if self.api_key:
-            response = requests.get(
-                self._request_url("info"),
-                params=args,
-                headers={"Authorization": "Bearer " + self.api_key},
-            )
-        else:
-            response = requests.get(
-                self._request_url("info"), auth=self.auth, params=args
-            )
-        return self._decode(response)
+        return self._request("GET", "info", params=args)
 
     def listitems(self, site_name=""):
         """
@@ -62,17 +130,7 @@ class NeoCities:
 
         """
         args = {"sitename": site_name} if site_name else None
-        if self.api_key:
-            response = requests.get(
-                self._request_url("list"),
-                params=args,
-                headers={"Authorization": "Bearer " + self.api_key},
-            )
-        else:
-            response = requests.get(
-                self._request_url("list"), auth=self.auth, params=args
-            )
-        return self._decode(response)
+        return self._request("GET", "list", params=args)
 
     def delete(self, *filenames):
         """
@@ -92,17 +150,7 @@ class NeoCities:
         args = {"filenames[]": []}
         for i in filenames:
             args["filenames[]"].append(i)
-        if self.api_key:
-            response = requests.get(
-                self._request_url("delete"),
-                data=args,
-                headers={"Authorization": "Bearer " + self.api_key},
-            )
-        else:
-            response = requests.post(
-                self._request_url("delete"), auth=self.auth, data=args
-            )
-        return self._decode(response)
+        return self._request("POST", "delete", data=args)
 
     def upload(self, *filenames):
         """
@@ -110,9 +158,10 @@ class NeoCities:
 
         Parameters
         ----------
-        filenames: *tuple (str, str)
-            The names of the files to be uploaded in the format
-            (name_on_disk, name_on_server)
+        filenames: *tuple (str or bytes or file, str)
+            The files to be uploaded in the format
+            (name_on_disk, name_on_server), where name_on_disk may instead
+            be the file's content or a binary file object.
             Note: name_on_server must include the file extension.
 
         Returns
@@ -124,25 +173,88 @@ class NeoCities:
 
         # NeoCities API expects a dict in the following format:
         # { name_on_server: <file_object> }
-        args = {pair[1]: open(pair[0], "rb") for pair in filenames}
-        if self.api_key:
-            response = requests.post(
-                self._request_url("upload"),
-                files=args,
-                headers={"Authorization": "Bearer " + self.api_key},
-            )
-        else:
-            response = requests.post(
-                self._request_url("upload"), auth=self.auth, files=args
-            )
-        return self._decode(response)
+        args = {}
+        opened = []
+        try:
+            for source, name_on_server in filenames:
+                if isinstance(source, (bytes, bytearray)):
+                    args[name_on_server] = io.BytesIO(source)
+                elif hasattr(source, "read"):
+                    args[name_on_server] = source
+                else:
+                    args[name_on_server] = open(source, "rb")
+                    opened.append(args[name_on_server])
+            return self._request("POST", "upload", files=args)
+        finally:
+            for file in opened:
+                file.close()
 
     def _request_url(self, method):
         return "{0}/api/{1}".format(self.url, method)
 
+    def _request(self, http_method, method, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            start = time.monotonic()
+            try:
+                response = self.session.request(
+                    http_method,
+                    self._request_url(method),
+                    timeout=self.timeout,
+                    **kwargs,
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                self._record(time.monotonic() - start, failed=True)
+                if last_attempt:
+                    raise
+                delay = self.backoff * 2**attempt
+            else:
+                self._record(
+                    time.monotonic() - start,
+                    throttled=response.status_code == 429,
+                    failed=response.status_code != 200,
+                )
+                if response.status_code not in self.RETRY_STATUS_CODES or last_attempt:
+                    return self._decode(response)
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self.backoff * 2**attempt
+
+            for file in kwargs.get("files", {}).values():
+                file.seek(0)
+            wait_to_retry(self, method, attempt, delay)
+
+    def _retry_after(self, response):
+        retry_after = response.headers.get("Retry-After")
+        if not retry_after:
+            return None
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            pass
+        try:
+            retry_at = parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            return None
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0)
+
+    def _record(self, latency, throttled=False, failed=False):
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            self.stats["throttled"] += throttled
+            self.stats["failures"] += failed
+            self.stats["latency_seconds"] += latency
+            self.stats["max_latency_seconds"] = max(
+                self.stats["max_latency_seconds"], latency
+            )
+
     def _decode(self, response):
         if response.status_code != 200:
-            print(response.__dict__)
+            logging.error(
+                f"NeoCities request failed: {response.status_code} {response.text}"
+            )
             raise NeoCities.InvalidRequestError(response.status_code, response._content)
         else:
             return response.json()
@@ -0,0 +1,266 @@
+"""
+Full-text search over template entry field values.
+
+Field values and entry paths are indexed in the TemplateFieldValueSearch
+FTS5 table (migrations/011.sql), which triggers on TemplateFieldValue and
+TemplateEntry keep up to date. The triggers index values as stored, HTML
+tags included; the app reindexes what it saves as plain text with
+index_entries.
+Published sites get a prebuilt index of their own, see public_index.
+"""
+
+import html
+import json
+import re
+
+TOKEN_RE = re.compile(r"\w+")
+
+TAG_RE = re.compile(r"<[^>]*>")
+
+
+def plain_text(value):
+    """
+    A field value as text, with HTML tags removed and entities decoded.
+    Lists and dicts have their items joined with spaces.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(plain_text(item) for item in value)
+    return " ".join(html.unescape(TAG_RE.sub(" ", str(value))).split())
+
+
+def search_text(value_json):
+    """
+    The text a TemplateFieldValue is indexed as, also registered as the
+    SQL function search_text for migrations.
+    """
+    try:
+        value = json.loads(value_json)
+    except (TypeError, ValueError):
+        value = value_json
+    return plain_text(value)
+
+
+def register_functions(db):
+    db.create_function("search_text", 1, search_text, deterministic=True)
+
+
+def tokenize(value):
+    """
+    Split a field value into lowercase words, ignoring HTML tags.
+
+    Parameters
+    ----------
+    value : object
+        A field value; anything other than a string is converted with str,
+        lists and dicts have their items tokenized.
+
+    Returns
+    -------
+    tokens : list of str
+    """
+    return TOKEN_RE.findall(plain_text(value).lower())
+
+
+def match_expression(query):
+    """
+    FTS5 MATCH expression for user input: every word of query must start a
+    word of the value. Returns None when query has no words.
+    """
+    tokens = dict.fromkeys(tokenize(query))
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search_entries(db, query, template_id=None, field_names=None, limit=50):
+    """
+    Find entries with a field value matching query, best matches first.
+
+    A field value or entry path matches when it contains every word of
+    query, as a word or the start of one; words spread over different
+    fields of an entry do not match.
+
+    Parameters
+    ----------
+    db : sqlite3.Connection
+    query : str
+        Words to search for, as typed by a user.
+    template_id : int, optional
+        Only search entries of this template.
+    field_names : list of str, optional
+        Only search these fields.
+    limit : int, optional
+        Maximum number of entries returned, all of them if None.
+
+    Returns
+    -------
+    entries : list of dict
+        id, template_id and entry_path of each matching entry, the names
+        of its matching fields (none when only its path matched) and its
+        score (bm25, lower is better).
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+
+    conditions = ["TemplateFieldValueSearch MATCH ?"]
+    parameters = [expression]
+    if field_names:
+        conditions.append(
+            f"template_field_name IN ({', '.join('?' * len(field_names))})"
+        )
+        parameters.extend(field_names)
+    entry_conditions = ""
+    if template_id is not None:
+        entry_conditions = "WHERE TemplateEntry.template_id = ?"
+        parameters.append(str(template_id))
+    parameters.append(-1 if limit is None else limit)
+
+    rows = db.execute(
+        f"""
+        SELECT
+            TemplateEntry.id,
+            TemplateEntry.template_id,
+            TemplateEntry.entry_path,
+            json_group_array(matches.template_field_name)
+                FILTER (WHERE matches.template_field_name IS NOT NULL)
+                AS field_names,
+            min(matches.rank) AS score
+        FROM (
+            SELECT template_entry_id, template_field_name, rank
+            FROM TemplateFieldValueSearch
+            WHERE {" AND ".join(conditions)}
+        ) AS matches
+        INNER JOIN TemplateEntry ON TemplateEntry.id = matches.template_entry_id
+        {entry_conditions}
+        GROUP BY TemplateEntry.id
+        ORDER BY score, TemplateEntry.id
+        LIMIT ?
+    """,
+        parameters,
+    ).fetchall()
+    return [
+        dict(
+            id=row["id"],
+            template_id=row["template_id"],
+            entry_path=row["entry_path"],
+            field_names=json.loads(row["field_names"]),
+            score=row["score"],
+        )
+        for row in rows
+    ]
+
+
+def index_entries(db, template_entry_ids):
+    """
+    Reindex the field values of entries as plain text, in place of what
+    the triggers indexed. The caller commits.
+    """
+    rows = db.execute(
+        """
+        SELECT id, value_json FROM TemplateFieldValue
+        WHERE template_entry_id IN (SELECT value FROM json_each(?))
+    """,
+        (json.dumps(list(template_entry_ids)),),
+    ).fetchall()
+    db.executemany(
+        "UPDATE TemplateFieldValueSearch SET value=? WHERE rowid=?",
+        [(search_text(value_json), id) for id, value_json in rows],
+    )
+
+
+def rebuild_index(db):
+    """
+    Reindex every field value and entry path, for databases whose index
+    has drifted from TemplateFieldValue (e.g. values written with the
+    triggers dropped).
+
+    Returns
+    -------
+    indexed : int
+        The number of field values indexed.
+    """
+    db.execute("DELETE FROM TemplateFieldValueSearch")
+    indexed = db.executemany(
+        """
+        INSERT INTO TemplateFieldValueSearch(rowid, value, template_field_name, template_entry_id)
+        VALUES (?, ?, ?, ?)
+    """,
+        [
+            (id, search_text(value_json), template_field_name, template_entry_id)
+            for id, value_json, template_field_name, template_entry_id in db.execute("""
+                SELECT id, value_json, template_field_name, template_entry_id
+                FROM TemplateFieldValue
+            """).fetchall()
+        ],
+    ).rowcount
+    db.execute("""
+        INSERT INTO TemplateFieldValueSearch(rowid, value, template_entry_id)
+        SELECT -id, entry_path, id FROM TemplateEntry WHERE entry_path IS NOT NULL
+    """)
+    db.execute(
+        "INSERT INTO TemplateFieldValueSearch(TemplateFieldValueSearch) VALUES ('optimize')"
+    )
+    db.commit()
+    return indexed
+
+
+def entry_token_scores(values, field_weights):
+    """
+    Score the words of an entry for the public search index.
+
+    Parameters
+    ----------
+    values : dict
+        {field name: value} of the entry.
+    field_weights : dict
+        {field name: weight} of the fields searched.
+
+    Returns
+    -------
+    scores : dict
+        {token: sum of the weights of each occurrence}
+    """
+    scores = {}
+    for field_name, weight in field_weights.items():
+        for token in tokenize(values.get(field_name)):
+            scores[token] = scores.get(token, 0) + weight
+    return scores
+
+
+def public_index(entries, field_weights):
+    """
+    Build the search index published next to a template's index.
+
+    The index is JSON with three keys: ``fields``, the field weights it was
+    built with; ``entries``, a [path, title] pair per entry; and
+    ``tokens``, mapping each word to a flat list of alternating entry
+    positions and scores, so a client only has to look words up and add
+    scores.
+
+    Parameters
+    ----------
+    entries : list of tuple (str, str, dict)
+        (path, title, token scores from entry_token_scores) per entry.
+
+    Returns
+    -------
+    index_json : str
+    """
+    tokens = {}
+    for position, (_, _, scores) in enumerate(entries):
+        for token, score in scores.items():
+            tokens.setdefault(token, []).extend((position, round(score, 2)))
+    return json.dumps(
+        dict(
+            fields=field_weights,
+            entries=[[path, title] for path, title, _ in entries],
+            tokens=dict(sorted(tokens.items())),
+        ),
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
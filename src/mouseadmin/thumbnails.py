@@ -0,0 +1,258 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from PIL import Image
+import requests
+
+from mouseadmin.file_cache import write_atomic
+
+THUMBNAIL_SIZE = (250, 250)
+
+THUMBNAIL_FORMAT = "png"
+
+
+def make_thumbnail(image_bytes, size=THUMBNAIL_SIZE, format=THUMBNAIL_FORMAT):
+    """
+    Shrink an image to fit within size.
+
+    Parameters
+    ----------
+    image_bytes : bytes
+        The full-size image.
+    size : tuple (int, int)
+        Maximum (width, height) of the thumbnail.
+    format : str
+        Image format the thumbnail is saved as.
+
+    Returns
+    -------
+    thumbnail_bytes : bytes
+        The encoded thumbnail.
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.thumbnail(size)
+    image_bytes_io = io.BytesIO()
+    image.save(image_bytes_io, format=format)
+    return image_bytes_io.getvalue()
+
+
+class ThumbnailCache:
+    """
+    Thumbnails stored on disk, keyed by source URL and thumbnail
+    parameters, along with the SHA1 hash of the source image they were
+    made from.
+
+    Each thumbnail is two files named after the key: the image itself and
+    a JSON file recording the source URL, its hash and the parameters.
+    """
+
+    def __init__(self, base_dir="cache/thumbnails"):
+        self.base_dir = base_dir
+
+    def _key(self, source_url, size, format):
+        return hashlib.sha1(
+            json.dumps([source_url, list(size), format]).encode("utf-8")
+        ).hexdigest()
+
+    def _paths(self, key):
+        path = os.path.join(self.base_dir, key)
+        return path + ".json", path + ".thumb"
+
+    def get(
+        self, source_url, source_hash=None, size=THUMBNAIL_SIZE, format=THUMBNAIL_FORMAT
+    ):
+        """
+        Get a cached thumbnail.
+
+        Parameters
+        ----------
+        source_url : str
+            URL of the full-size image.
+        source_hash : str, optional
+            SHA1 hash of the full-size image, if known without fetching it.
+            A thumbnail made from a different source is treated as missing.
+
+        Returns
+        -------
+        thumbnail_bytes : bytes or None
+            The thumbnail, or None if it is not cached.
+        """
+        metadata_path, thumbnail_path = self._paths(self._key(source_url, size, format))
+        try:
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+            if source_hash is not None and metadata["source_hash"] != source_hash:
+                return None
+            with open(thumbnail_path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(
+        self,
+        source_url,
+        source_bytes,
+        thumbnail_bytes,
+        size=THUMBNAIL_SIZE,
+        format=THUMBNAIL_FORMAT,
+    ):
+        """
+        Store the thumbnail made from source_bytes, the image at source_url.
+        """
+        os.makedirs(self.base_dir, exist_ok=True)
+        metadata_path, thumbnail_path = self._paths(self._key(source_url, size, format))
+        metadata = dict(
+            source_url=source_url,
+            source_hash=hashlib.sha1(source_bytes).hexdigest(),
+            size=list(size),
+            format=format,
+        )
+        # write the thumbnail before its metadata so readers never see
+        # metadata without the matching image
+        write_atomic(thumbnail_path, thumbnail_bytes)
+        write_atomic(metadata_path, json.dumps(metadata).encode("utf-8"))
+
+    def invalidate(self, source_url=None):
+        """
+        Remove the cached thumbnails of source_url, or every thumbnail when
+        source_url is None.
+
+        Returns
+        -------
+        removed : int
+            The number of thumbnails removed.
+        """
+        if not os.path.isdir(self.base_dir):
+            return 0
+
+        removed = 0
+        for filename in os.listdir(self.base_dir):
+            if not filename.endswith(".json"):
+                continue
+            metadata_path, thumbnail_path = self._paths(filename[: -len(".json")])
+            if source_url is not None:
+                try:
+                    with open(metadata_path) as f:
+                        if json.load(f)["source_url"] != source_url:
+                            continue
+                except (FileNotFoundError, ValueError):
+                    continue
+            for path in (metadata_path, thumbnail_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            removed += 1
+        return removed
+
+
+class ThumbnailPipeline:
+    """
+    Makes thumbnails for many images at once: cached thumbnails are reused,
+    missing sources are downloaded concurrently with at most
+    fetches_per_host downloads per host, and decoding and resizing runs on
+    a pool of worker processes.
+
+    Parameters
+    ----------
+    fetch : callable
+        Takes an image URL and returns the image's bytes.
+    cache : ThumbnailCache
+        Where thumbnails are looked up and stored.
+    workers : int
+        Number of download threads and resize processes.
+    fetches_per_host : int
+        Maximum concurrent downloads from one host.
+    """
+
+    def __init__(self, fetch, cache, workers=4, fetches_per_host=4):
+        self.fetch = fetch
+        self.cache = cache
+        self.workers = workers
+        self.fetches_per_host = fetches_per_host
+        self.host_semaphores = {}
+        self.host_semaphores_lock = threading.Lock()
+
+    def run(self, image_urls, source_hashes=None):
+        """
+        Get thumbnails for image_urls.
+
+        Parameters
+        ----------
+        image_urls : iterable of str
+            URLs of the full-size images.
+        source_hashes : dict, optional
+            {image_url: sha1 hash} for sources whose hash is known without
+            fetching them; see ThumbnailCache.get.
+
+        Returns
+        -------
+        thumbnails : dict
+            {image_url: thumbnail bytes} for every image that could be
+            fetched.
+        """
+        start = time.monotonic()
+        source_hashes = source_hashes or {}
+        thumbnails = {}
+        missing = []
+        for image_url in dict.fromkeys(image_urls):
+            cached = self.cache.get(image_url, source_hash=source_hashes.get(image_url))
+            if cached is None:
+                missing.append(image_url)
+            else:
+                thumbnails[image_url] = cached
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            fetched = [
+                (image_url, source)
+                for image_url, source in zip(
+                    missing, executor.map(self._fetch, missing)
+                )
+                if source is not None
+            ]
+
+        sources = [source for _, source in fetched]
+        if len(sources) > 1 and self.workers > 1:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                made = list(executor.map(make_thumbnail, sources))
+        else:
+            made = [make_thumbnail(source) for source in sources]
+
+        for (image_url, source), thumbnail_bytes in zip(fetched, made):
+            self.cache.put(image_url, source, thumbnail_bytes)
+            thumbnails[image_url] = thumbnail_bytes
+
+        logging.info(
+            f"Made {len(made)} thumbnails ({len(thumbnails) - len(made)} cached, "
+            f"{len(missing) - len(fetched)} unavailable) "
+            f"in {time.monotonic() - start:.2f}s"
+        )
+        return thumbnails
+
+    def _host_semaphore(self, image_url):
+        host = urlparse(image_url).netloc
+        with self.host_semaphores_lock:
+            if host not in self.host_semaphores:
+                self.host_semaphores[host] = threading.BoundedSemaphore(
+                    self.fetches_per_host
+                )
+            return self.host_semaphores[host]
+
+    def _fetch(self, image_url):
+        with self._host_semaphore(image_url):
+            try:
+                return self.fetch(image_url)
+            except requests.exceptions.ConnectionError:
+                logging.warning(f"Could not fetch {image_url}")
+                return None
@@ -0,0 +1,218 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import time
+
+from mouseadmin.neocities import NeoCities
+
+
+class TokenBucket:
+    """
+    Rate limiter handing out up to `rate` tokens a second, with bursts of
+    up to `capacity` tokens.
+
+    The rate adapts to the server: it halves each time a request is
+    throttled and creeps back up by `increase` after each request that
+    is not.
+    """
+
+    def __init__(self, rate, capacity, min_rate=0.05, max_rate=None, increase=0.05):
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate
+        self.max_rate = max_rate or rate * 4
+        self.increase = increase
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take a token, sleeping until one is available.
+
+        Returns
+        -------
+        waited : float
+            Seconds spent waiting.
+        """
+        waited = 0
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def throttled(self):
+        with self.lock:
+            self._refill()
+            self.rate = max(self.rate / 2, self.min_rate)
+            self.tokens = min(self.tokens, 0)
+
+    def succeeded(self):
+        with self.lock:
+            self._refill()
+            self.rate = min(self.rate + self.increase, self.max_rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.tokens + (now - self.updated_at) * self.rate, self.capacity
+        )
+        self.updated_at = now
+
+
+def pack_batches(items, max_batch_bytes, max_batch_files):
+    """
+    Group items into batches of at most max_batch_files items and
+    max_batch_bytes bytes. An item bigger than max_batch_bytes gets a
+    batch of its own.
+
+    Parameters
+    ----------
+    items : list of tuple (object, int)
+        (item, size in bytes) pairs.
+
+    Returns
+    -------
+    batches : list of list
+        The items, in their original order.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for item, size in items:
+        if batch and (
+            len(batch) >= max_batch_files or batch_bytes + size > max_batch_bytes
+        ):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(item)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class UploadScheduler:
+    """
+    Uploads files to a NeoCities client in batches packed by size and
+    count, at a rate limited by a TokenBucket that slows down when the
+    client reports throttled (429) responses. A batch whose upload is
+    throttled even after the client's own retries is uploaded again once
+    the slower rate allows.
+
+    Parameters
+    ----------
+    client : NeoCities or FileClient
+        Where files are uploaded. Throttling is read from client.stats
+        when the client keeps them.
+    max_batch_bytes : int
+        Maximum total size of the files in one upload request.
+    max_batch_files : int
+        Maximum number of files in one upload request.
+    rate : float
+        Upload requests per second to start from.
+    burst : int
+        Upload requests that may be sent back to back before the rate
+        limit applies.
+    concurrency : int
+        Upload requests that may run at the same time.
+    throttled_retries : int
+        Times a batch is uploaded again after the client raises a 429,
+        before the error is raised.
+    """
+
+    def __init__(
+        self,
+        client,
+        max_batch_bytes=8 * 1024 * 1024,
+        max_batch_files=25,
+        rate=0.5,
+        burst=2,
+        concurrency=1,
+        throttled_retries=3,
+    ):
+        self.client = client
+        self.max_batch_bytes = max_batch_bytes
+        self.max_batch_files = max_batch_files
+        self.concurrency = concurrency
+        self.throttled_retries = throttled_retries
+        self.bucket = TokenBucket(rate, burst)
+
+    def upload(self, files):
+        """
+        Upload files.
+
+        Parameters
+        ----------
+        files : list of tuple (tuple, int)
+            (argument to client.upload, size in bytes) pairs.
+
+        Returns
+        -------
+        stats : dict
+            Number of batches, total and slowest batch seconds, seconds
+            spent waiting on the rate limit, throttled responses and the
+            rate the limiter ended at.
+        """
+        start = time.monotonic()
+        batches = pack_batches(files, self.max_batch_bytes, self.max_batch_files)
+        if self.concurrency > 1 and len(batches) > 1:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                results = list(executor.map(self._upload_batch, batches))
+        else:
+            results = [self._upload_batch(batch) for batch in batches]
+
+        stats = dict(
+            batches=len(batches),
+            seconds=round(time.monotonic() - start, 3),
+            slowest_batch_seconds=round(
+                max((seconds for seconds, _, _ in results), default=0), 3
+            ),
+            rate_limit_wait_seconds=round(sum(waited for _, waited, _ in results), 3),
+            throttled=sum(throttled for _, _, throttled in results),
+            rate=round(self.bucket.rate, 3),
+        )
+        logging.info(
+            f"Uploaded {len(files)} files in {stats['batches']} batches "
+            f"in {stats['seconds']}s ({stats['rate_limit_wait_seconds']}s rate "
+            f"limited, {stats['throttled']} throttled, now {stats['rate']} batches/s)"
+        )
+        return stats
+
+    def _upload_batch(self, batch):
+        waited = 0
+        throttled = 0
+        for attempt in range(self.throttled_retries + 1):
+            waited += self.bucket.acquire()
+            throttled_before = self._throttled()
+            start = time.monotonic()
+            logging.info(f"Uploading batch of size {len(batch)}")
+            try:
+                self.client.upload(*batch)
+            except NeoCities.InvalidRequestError as e:
+                if e.status_code != 429:
+                    raise
+                # count the raised 429 when the client did not
+                throttled += max(self._throttled() - throttled_before, 1)
+                self.bucket.throttled()
+                if attempt == self.throttled_retries:
+                    raise
+                logging.warning("Upload batch throttled, retrying at a lower rate")
+                continue
+            seconds = time.monotonic() - start
+            batch_throttled = self._throttled() - throttled_before
+            throttled += batch_throttled
+            if batch_throttled:
+                self.bucket.throttled()
+            else:
+                self.bucket.succeeded()
+            return seconds, waited, throttled
+
+    def _throttled(self):
+        return getattr(self.client, "stats", {}).get("throttled", 0)